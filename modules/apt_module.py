@@ -1,6 +1,9 @@
 import json
 import os
 import re
+import sys
+import time
+import random
 import shutil
 import tempfile
 import asyncio
@@ -29,14 +32,30 @@ except ImportError:
 PLUGINS_DIR = "./third_party_modules"
 SOURCES_FILE = "./third_party_modules/sources.json"
 
+class _SourceError(Exception):
+    """单个源更新失败"""
+
+    def __init__(self, source: Dict, reason: str):
+        super().__init__(reason)
+        self.source = source
+
 class PluginManagerModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "插件管理器"
         self.description = "管理第三方插件（启用/禁用/安装/上传/列表/删除）"
-        self.version = "1.6.1"
+        self.version = "1.8.1"
         self.author = "lanyi233"
         self.client = None
+        self.session = None
+        self.source_timeout = aiohttp.ClientTimeout(total=30)
+        
+        # 源索引缓存：安装时索引不超过最长缓存时间则直接使用，不再先更新所有源
+        self.index_max_age = 3600
+        self.auto_refresh_interval = 0  # 后台定时刷新源的间隔（秒），0 表示关闭
+        self.auto_refresh_jitter = 0.1  # 间隔的随机抖动比例
+        self._refresh_lock = None
+        self._refresh_task = None
 
     def get_commands(self) -> Dict[str, str]:
         return {
@@ -59,6 +78,7 @@ class PluginManagerModule(BaseModule):
             "• <code>,apt disable 插件名</code> 禁用插件\n"
             "• <code>,apt enable 插件名</code> 启用插件\n"
             "• <code>,apt install</code> 安装插件\n"
+            "• <code>,apt install 插件ID [--refresh]</code> 从源安装插件（--refresh 先更新源）\n"
             "• <code>,apt upload 插件名</code> 上传插件文件\n"
             "• <code>,apt remove 插件名</code> 删除插件\n"
             "• <code>,apt update</code> 更新源\n"
@@ -72,10 +92,25 @@ class PluginManagerModule(BaseModule):
         self.client = client
         os.makedirs(PLUGINS_DIR, exist_ok=True)
         await self._load_sources()
+        if self.auto_refresh_interval > 0:
+            self._refresh_task = asyncio.ensure_future(self._auto_refresh_loop())
 
     async def module_unloaded(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
         self.client = None
 
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """获取共享的连接池会话（懒加载）"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=16, limit_per_host=4, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.source_timeout)
+        return self.session
+
     async def handle_command(self, command: str, event: NewMessage.Event, args: List[str]) -> None:
         if command == "apt":
             if not args:
@@ -347,34 +382,34 @@ class PluginManagerModule(BaseModule):
             return
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        await event.edit(f"❌ 下载源信息失败: HTTP {response.status}", parse_mode='html')
-                        return
-                    
-                    # 直接读取文本内容并尝试解析JSON
-                    text_content = await response.text()
-                    
-                    try:
-                        source_data = json.loads(text_content)
-                    except json.JSONDecodeError:
-                        # 尝试从HTML内容中提取JSON
-                        match = re.search(r'\{.*\}', text_content, re.DOTALL)
-                        if match:
-                            try:
-                                source_data = json.loads(match.group(0))
-                            except json.JSONDecodeError as e:
-                                await event.edit(f"❌ 解析源数据失败: {str(e)}", parse_mode='html')
-                                return
-                        else:
-                            await event.edit("❌ 源返回的不是有效的JSON格式", parse_mode='html')
+            session = self._get_session()
+            async with session.get(url) as response:
+                if response.status != 200:
+                    await event.edit(f"❌ 下载源信息失败: HTTP {response.status}", parse_mode='html')
+                    return
+                
+                # 直接读取文本内容并尝试解析JSON
+                text_content = await response.text()
+                
+                try:
+                    source_data = json.loads(text_content)
+                except json.JSONDecodeError:
+                    # 尝试从HTML内容中提取JSON
+                    match = re.search(r'\{.*\}', text_content, re.DOTALL)
+                    if match:
+                        try:
+                            source_data = json.loads(match.group(0))
+                        except json.JSONDecodeError as e:
+                            await event.edit(f"❌ 解析源数据失败: {str(e)}", parse_mode='html')
                             return
-                    
-                    # 验证源格式
-                    if not all(key in source_data for key in ['name', 'id', 'data']):
-                        await event.edit("❌ 无效的源格式", parse_mode='html')
+                    else:
+                        await event.edit("❌ 源返回的不是有效的JSON格式", parse_mode='html')
                         return
+                
+                # 验证源格式
+                if not all(key in source_data for key in ['name', 'id', 'data']):
+                    await event.edit("❌ 无效的源格式", parse_mode='html')
+                    return
         except Exception as e:
             await event.edit(f"❌ 添加源失败: {str(e)}", parse_mode='html')
     
@@ -401,29 +436,31 @@ class PluginManagerModule(BaseModule):
         return results
     
     async def _install_from_source(self, event: NewMessage.Event, plugin_ids: list[str]) -> None:
-        await self._update_sources(event)
-        """从源安装多个插件"""
+        """从源安装多个插件；源索引过期或指定 --refresh 时才先更新源"""
+        refresh = "--refresh" in plugin_ids
+        plugin_ids = [plugin_id for plugin_id in plugin_ids if plugin_id != "--refresh"]
+        if not plugin_ids:
+            await event.edit(self.get_command_usage("apt"), parse_mode='html')
+            return
+        
+        refreshed = False
+        if self.sources and (refresh or self._index_age() > self.index_max_age):
+            await self._update_sources(event)
+            refreshed = True
+        
+        lookups = {plugin_id: await self._resolve_plugin(plugin_id) for plugin_id in plugin_ids}
+        if not refreshed and self.sources and not all(lookups.values()):
+            # 缓存的索引中找不到时更新一次源再查找
+            await self._update_sources(event)
+            for plugin_id, results in lookups.items():
+                if not results:
+                    lookups[plugin_id] = await self._resolve_plugin(plugin_id)
+        
         success = []
         failed = []
         
-        for plugin_id in plugin_ids:
-            # 检查插件ID格式
-            if '/' in plugin_id:
-                source_id, plugin_id = plugin_id.split('/', 1)
-                # 在指定源中查找
-                results = []
-                for source in self.sources:
-                    if source.get('id') == source_id:
-                        for module in source.get('data', []):
-                            if module.get('id') == plugin_id:
-                                results.append({
-                                    'source': source,
-                                    'module': module
-                                })
-            else:
-                # 在所有源中查找
-                results = await self._find_plugin_in_sources(plugin_id)
-            
+        for plugin_id, results in lookups.items():
+            plugin_id = plugin_id.split('/', 1)[-1]
             if not results:
                 failed.append(plugin_id)
                 continue
@@ -440,27 +477,27 @@ class PluginManagerModule(BaseModule):
             
             # 下载插件
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(module_url) as response:
-                        if response.status != 200:
-                            failed.append(f"{plugin_id} (HTTP {response.status})")
-                            continue
-                        
-                        content = await response.text()
-                        
-                        # 验证内容
-                        if "class" not in content or "BaseModule" not in content:
-                            failed.append(f"{plugin_id} (无效文件)")
-                            continue
-                        
-                        # 保存文件
-                        filename = f"{plugin_id}_module.py"
-                        filepath = os.path.join(PLUGINS_DIR, filename)
-                        
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            f.write(content)
-                        
-                        success.append(f"{module['name']} ({plugin_id})")
+                session = self._get_session()
+                async with session.get(module_url) as response:
+                    if response.status != 200:
+                        failed.append(f"{plugin_id} (HTTP {response.status})")
+                        continue
+                    
+                    content = await response.text()
+                    
+                    # 验证内容
+                    if "class" not in content or "BaseModule" not in content:
+                        failed.append(f"{plugin_id} (无效文件)")
+                        continue
+                    
+                    # 保存文件
+                    filename = f"{plugin_id}_module.py"
+                    filepath = os.path.join(PLUGINS_DIR, filename)
+                    
+                    with open(filepath, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                    
+                    success.append(f"{module['name']} ({plugin_id})")
             except Exception as e:
                 failed.append(f"{plugin_id} ({str(e)})")
         
@@ -473,6 +510,43 @@ class PluginManagerModule(BaseModule):
         
         await event.edit(message.strip(), parse_mode='html')
     
+    async def _resolve_plugin(self, plugin_id: str) -> List[Dict]:
+        """按 插件ID 或 源ID/插件ID 在源索引中查找插件"""
+        if '/' not in plugin_id:
+            # 在所有源中查找
+            return await self._find_plugin_in_sources(plugin_id)
+        
+        # 在指定源中查找
+        source_id, plugin_id = plugin_id.split('/', 1)
+        results = []
+        for source in self.sources:
+            if source.get('id') == source_id:
+                for module in source.get('data', []):
+                    if module.get('id') == plugin_id:
+                        results.append({
+                            'source': source,
+                            'module': module
+                        })
+        return results
+
+    def _index_age(self) -> float:
+        """源索引中最久未刷新的源距今的秒数；按最近一次尝试计算，持续失败的源不会让索引一直过期"""
+        if not self.sources:
+            return 0
+        return time.time() - min(source.get('checked_at', 0) for source in self.sources)
+
+    async def _auto_refresh_loop(self) -> None:
+        """后台定时刷新源索引，间隔带随机抖动；期间已手动更新过则跳过本次"""
+        while True:
+            jitter = self.auto_refresh_jitter
+            await asyncio.sleep(self.auto_refresh_interval * random.uniform(1 - jitter, 1 + jitter))
+            if not self.sources or self._index_age() < self.auto_refresh_interval * (1 - jitter):
+                continue
+            try:
+                await self._refresh_sources()
+            except Exception:
+                pass
+
     async def _search_plugins(self, event: NewMessage.Event, keyword: str) -> None:
         """搜索插件"""
         results = []
@@ -514,77 +588,31 @@ class PluginManagerModule(BaseModule):
         await event.edit(message, parse_mode='html')
 
     async def _update_sources(self, event: NewMessage.Event) -> None:
-        """更新所有源"""
+        """更新所有源并显示结果"""
         if not self.sources:
             await event.edit("📡 没有可更新的源", parse_mode='html')
             return
         
-        # 初始化进度消息
-        progress_msg = await event.edit("🔄 正在更新源列表...\n\n0% 完成 (0/0)", parse_mode='html')
-        
-        updated_count = 0
-        failed_sources = []
         total = len(self.sources)
+        progress_msg = await event.edit(f"🔄 正在更新源列表...\n\n0% 完成 (0/{total})", parse_mode='html')
+        last_edit = time.monotonic()
         
-        try:
-            for i, source in enumerate(self.sources):
-                # 更新进度
-                progress = int((i + 1) / total * 100)
+        async def on_progress(finished: int, total: int) -> None:
+            nonlocal last_edit
+            if finished < total and time.monotonic() - last_edit >= 1:
+                last_edit = time.monotonic()
                 await progress_msg.edit(
-                    f"🔄 正在更新源列表...\n\n{progress}% 完成 ({i+1}/{total})\n"
-                    f"当前: {source.get('name', '未命名源')}",
+                    f"🔄 正在更新源列表...\n\n{int(finished / total * 100)}% 完成 ({finished}/{total})",
                     parse_mode='html'
                 )
-                
-                # 下载更新源信息
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(source['url']) as response:
-                            if response.status != 200:
-                                raise Exception(f"HTTP {response.status}")
-                            
-                            # 直接读取文本内容并尝试解析JSON
-                            text_content = await response.text()
-                            
-                            try:
-                                new_source = json.loads(text_content)
-                            except json.JSONDecodeError:
-                                # 尝试从HTML内容中提取JSON
-                                match = re.search(r'\{.*\}', text_content, re.DOTALL)
-                                if match:
-                                    try:
-                                        new_source = json.loads(match.group(0))
-                                    except json.JSONDecodeError as e:
-                                        raise Exception(f"JSON解析失败: {str(e)}")
-                                else:
-                                    raise Exception("响应不是有效的JSON格式")
-                            
-                            # 验证源格式
-                            if not all(key in new_source for key in ['name', 'id', 'data']):
-                                raise Exception("无效的源格式")
-                            
-                            # 检查ID是否匹配
-                            if new_source['id'] != source['id']:
-                                raise Exception(f"源ID不匹配: 本地 {source['id']} ≠ 远程 {new_source['id']}")
-                            
-                            # 保留原始URL
-                            new_source['url'] = source['url']
-                            
-                            # 更新源
-                            self.sources[i] = new_source
-                            updated_count += 1
-                
-                except Exception as e:
-                    failed_sources.append({
-                        'name': source.get('name', '未命名源'),
-                        'reason': str(e)
-                    })
-            
-            # 保存更新后的源列表
-            await self._save_sources()
+        
+        try:
+            updated_count, unchanged_count, failed_sources = await self._refresh_sources(on_progress)
             
             # 生成结果消息
-            result_msg = f"✅ 源更新完成\n\n更新成功: {updated_count}/{total}"
+            result_msg = f"✅ 源更新完成\n\n更新成功: {updated_count + unchanged_count}/{total}"
+            if unchanged_count:
+                result_msg += f"（其中 {unchanged_count} 个未变化）"
             if failed_sources:
                 result_msg += "\n\n❌ 更新失败:\n"
                 for failed in failed_sources:
@@ -594,3 +622,97 @@ class PluginManagerModule(BaseModule):
         
         except Exception as e:
             await progress_msg.edit(f"❌ 更新过程中发生错误: {str(e)}", parse_mode='html')
+
+    async def _refresh_sources(self, on_progress=None):
+        """并发刷新所有源并保存，返回 (更新数, 未变化数, 失败列表)；同一时间只进行一次刷新"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        
+        async with self._refresh_lock:
+            sources = list(self.sources)
+            updated_count = 0
+            unchanged_count = 0
+            failed_sources = []
+            
+            # 所有源共用连接池同时请求，按完成顺序处理
+            self._get_session()
+            tasks = [asyncio.ensure_future(self._fetch_source(source)) for source in sources]
+            try:
+                for finished, future in enumerate(asyncio.as_completed(tasks), 1):
+                    try:
+                        source, new_source = await future
+                        if new_source is None:
+                            unchanged_count += 1
+                        else:
+                            # 源列表在更新期间可能被修改，按对象定位
+                            for i, current in enumerate(self.sources):
+                                if current is source:
+                                    self.sources[i] = new_source
+                            updated_count += 1
+                    except _SourceError as e:
+                        failed_sources.append({
+                            'name': e.source.get('name', '未命名源'),
+                            'reason': str(e)
+                        })
+                    if on_progress is not None:
+                        await on_progress(finished, len(sources))
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            # 保存更新后的源列表
+            await self._save_sources()
+        return updated_count, unchanged_count, failed_sources
+
+    async def _fetch_source(self, source: Dict):
+        """条件请求单个源：未变化（304）时返回 (source, None)，否则返回 (source, 新的源数据)"""
+        headers = {}
+        if source.get('etag'):
+            headers['If-None-Match'] = source['etag']
+        if source.get('last_modified'):
+            headers['If-Modified-Since'] = source['last_modified']
+        
+        try:
+            session = self._get_session()
+            async with session.get(source['url'], headers=headers) as response:
+                if response.status == 304:
+                    source['fetched_at'] = source['checked_at'] = time.time()
+                    return source, None
+                if response.status != 200:
+                    raise Exception(f"HTTP {response.status}")
+                
+                # 直接读取文本内容并尝试解析JSON
+                text_content = await response.text()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+            
+            try:
+                new_source = json.loads(text_content)
+            except json.JSONDecodeError:
+                # 尝试从HTML内容中提取JSON
+                match = re.search(r'\{.*\}', text_content, re.DOTALL)
+                if match:
+                    try:
+                        new_source = json.loads(match.group(0))
+                    except json.JSONDecodeError as e:
+                        raise Exception(f"JSON解析失败: {str(e)}")
+                else:
+                    raise Exception("响应不是有效的JSON格式")
+            
+            # 验证源格式
+            if not all(key in new_source for key in ['name', 'id', 'data']):
+                raise Exception("无效的源格式")
+            
+            # 检查ID是否匹配
+            if new_source['id'] != source['id']:
+                raise Exception(f"源ID不匹配: 本地 {source['id']} ≠ 远程 {new_source['id']}")
+        except Exception as e:
+            source['checked_at'] = time.time()
+            raise _SourceError(source, str(e) or type(e).__name__) from e
+        
+        # 保留原始URL，记录缓存校验信息供下次条件请求使用
+        new_source['url'] = source['url']
+        new_source['etag'] = etag
+        new_source['last_modified'] = last_modified
+        new_source['fetched_at'] = new_source['checked_at'] = time.time()
+        return source, new_source
@@ -1,12 +1,26 @@
+import os
 import re
+import sys
+import csv
+import html
+import json
+import math
 import time
+import base64
+import random
+import sqlite3
 import asyncio
+import binascii
+import hashlib
+import tempfile
+import contextlib
 import subprocess
-import sys
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Optional
 from telethon.events import NewMessage
+from telethon.tl.types import MessageMediaDocument
 from modules.base_module import BaseModule
-from urllib.parse import unquote
+from urllib.parse import unquote, urlparse
 
 def _install_package(package_name: str):
     try:
@@ -17,26 +31,319 @@ def _install_package(package_name: str):
     except subprocess.CalledProcessError:
         raise ImportError(f"Failed to install {package_name}")
 
-try:
-    import bs4
-except ImportError:
-    _install_package('bs4')
-    import bs4
 try:
     import aiohttp
 except ImportError:
     _install_package('aiohttp')
     import aiohttp
 
+TITLE_READ_LIMIT = 64 * 1024  # 提取页面标题时最多读取的字节数
+TITLE_PATTERN = re.compile(rb'<title[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([A-Za-z0-9_\-]+)', re.IGNORECASE)
+URL_PATTERN = re.compile(r"https?://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]")
+REPORT_FIELDS = ('url', 'name', 'status', 'used', 'total', 'remaining', 'expire', 'days_left', 'error')
+NODE_READ_LIMIT = 16 * 1024 * 1024  # 统计节点时最多读取的订阅内容字节数
+NODE_LINE_LIMIT = 8192  # 单行只保留开头部分，足够识别协议
+NODE_URI_PATTERN = re.compile(rb'([A-Za-z][A-Za-z0-9+.-]{1,15})://')
+NODE_YAML_TYPE_PATTERN = re.compile(rb'type\s*:\s*["\']?([A-Za-z0-9-]+)')
+NODE_FLOW_TYPE_PATTERN = re.compile(rb'[{,]\s*type\s*:\s*["\']?([A-Za-z0-9-]+)')
+BASE64_LINE_PATTERN = re.compile(rb'[A-Za-z0-9+/_-]+={0,2}')
+BASE64_URLSAFE_TABLE = bytes.maketrans(b'-_', b'+/')
+PROTOCOL_ALIASES = {'hy2': 'hysteria2', 'shadowsocks': 'ss', 'shadowsocksr': 'ssr', 'socks': 'socks5', 'wg': 'wireguard'}
+WATCH_DB_FILE = "./third_party_modules/subinfo_watch.db"
+RATE_WINDOW = 86400  # 用量速率的指数平滑时间常数（秒）
+
+class _WatchStore:
+    """订阅监控的本地存储（SQLite）：监控列表与只在数值变化时记录的用量时间序列"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.row_factory = sqlite3.Row
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS watches ("
+                " id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, url TEXT NOT NULL, name TEXT,"
+                " used INTEGER, total INTEGER, expire INTEGER, rate REAL DEFAULT 0,"
+                " alerted INTEGER DEFAULT 0, last_check REAL, next_check REAL DEFAULT 0, error TEXT,"
+                " UNIQUE (chat_id, url));"
+                "CREATE TABLE IF NOT EXISTS samples ("
+                " watch_id INTEGER NOT NULL, ts INTEGER NOT NULL, used INTEGER, total INTEGER, expire INTEGER,"
+                " PRIMARY KEY (watch_id, ts)) WITHOUT ROWID;"
+            )
+        return self._db
+
+    def add(self, chat_id: int, url: str, name: str) -> int:
+        db = self._conn()
+        with db:
+            db.execute("INSERT OR IGNORE INTO watches (chat_id, url, name) VALUES (?, ?, ?)", (chat_id, url, name))
+        row = db.execute("SELECT id FROM watches WHERE chat_id = ? AND url = ?", (chat_id, url)).fetchone()
+        return row['id']
+
+    def remove(self, chat_id: int, watch_id: int) -> bool:
+        db = self._conn()
+        with db:
+            deleted = db.execute("DELETE FROM watches WHERE id = ? AND chat_id = ?", (watch_id, chat_id)).rowcount
+            if deleted:
+                db.execute("DELETE FROM samples WHERE watch_id = ?", (watch_id,))
+        return bool(deleted)
+
+    def list(self, chat_id: int) -> List[sqlite3.Row]:
+        return self._conn().execute("SELECT * FROM watches WHERE chat_id = ? ORDER BY id", (chat_id,)).fetchall()
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM watches").fetchone()[0]
+
+    def due(self, now: float, limit: int) -> List[sqlite3.Row]:
+        return self._conn().execute(
+            "SELECT * FROM watches WHERE next_check <= ? ORDER BY next_check LIMIT ?", (now, limit)
+        ).fetchall()
+
+    def save(self, updates: List[Dict]) -> None:
+        """一个事务内写回一批检查结果，数值有变化时追加一个样本点"""
+        db = self._conn()
+        with db:
+            for u in updates:
+                db.execute(
+                    "UPDATE watches SET used = ?, total = ?, expire = ?, rate = ?, alerted = ?,"
+                    " last_check = ?, next_check = ?, error = ? WHERE id = ?",
+                    (u['used'], u['total'], u['expire'], u['rate'], u['alerted'],
+                     u['last_check'], u['next_check'], u['error'], u['id'])
+                )
+                if u.get('sample'):
+                    db.execute(
+                        "INSERT OR REPLACE INTO samples (watch_id, ts, used, total, expire) VALUES (?, ?, ?, ?, ?)",
+                        (u['id'], int(u['last_check']), u['used'], u['total'], u['expire'])
+                    )
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class _NodeCounter:
+    """增量统计订阅内容中的节点：自动识别 base64、明文链接列表与 Clash YAML，解码后只保留未结束的一行"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self._mode = None  # 'base64' 或 'text'，读到第一行后确定
+        self._head = bytearray()
+        self._b64 = bytearray()  # 不足4字节、暂不能解码的 base64 余数
+        self._line = bytearray()
+        self._section = None  # 当前 YAML 顶层键
+        self._item_indent = None  # proxies 列表项中键的缩进
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def feed(self, data: bytes) -> None:
+        if self._mode is None:
+            self._head += data
+            head = self._head.lstrip(b'\xef\xbb\xbf \t\r\n')
+            newline = head.find(b'\n')
+            if newline < 0 and len(head) < 1024:
+                return
+            self._detect(head[:newline] if newline >= 0 else head[:1024])
+            # 去掉 BOM 与开头空白后再解码，否则 base64 的4字节对齐会整体错位
+            data, self._head = bytes(head), None
+        
+        if self._mode == 'text':
+            self._feed_text(data)
+            return
+        self._b64 += data.translate(BASE64_URLSAFE_TABLE, b' \t\r\n')
+        usable = len(self._b64) // 4 * 4
+        if usable:
+            self._decode(bytes(self._b64[:usable]))
+            del self._b64[:usable]
+
+    def close(self) -> None:
+        if self._mode is None:
+            head, self._head = bytes(self._head).lstrip(b'\xef\xbb\xbf \t\r\n'), None
+            if not head:
+                return
+            self._detect(head.split(b'\n', 1)[0])
+            self.feed(head)
+        if self._b64:
+            remainder = bytes(self._b64).rstrip(b'=')
+            self._decode(remainder + b'=' * (-len(remainder) % 4))
+            self._b64.clear()
+        if self._line:
+            self._count_line(bytes(self._line))
+            self._line.clear()
+
+    def _detect(self, first_line: bytes) -> None:
+        self._mode = 'base64' if BASE64_LINE_PATTERN.fullmatch(first_line.strip()) else 'text'
+
+    def _decode(self, data: bytes) -> None:
+        try:
+            self._feed_text(base64.b64decode(data))
+        except binascii.Error:
+            pass  # 损坏的分段直接跳过
+
+    def _feed_text(self, data: bytes) -> None:
+        self._line += data
+        start = 0
+        while True:
+            newline = self._line.find(b'\n', start)
+            if newline < 0:
+                break
+            self._count_line(bytes(self._line[start:newline]))
+            start = newline + 1
+        del self._line[:start]
+        if len(self._line) > NODE_LINE_LIMIT:
+            del self._line[NODE_LINE_LIMIT:]
+
+    def _count_line(self, line: bytes) -> None:
+        stripped = line.strip()
+        if not stripped or stripped.startswith(b'#'):
+            return
+        match = NODE_URI_PATTERN.match(stripped)
+        if match:
+            if match.group(1).lower() not in (b'http', b'https'):
+                self._add(match.group(1))
+            return
+        
+        # Clash YAML：只统计 proxies 下每个列表项自身的 type
+        indent = len(line) - len(line.lstrip(b' '))
+        if indent == 0 and not stripped.startswith(b'-'):
+            self._section = stripped.split(b':', 1)[0].strip(b'"\'')
+            self._item_indent = None
+            return
+        if self._section != b'proxies':
+            return
+        if stripped.startswith(b'-'):
+            self._item_indent = indent + 2
+            item = stripped[1:].lstrip()
+            if item.startswith(b'{'):
+                match = NODE_FLOW_TYPE_PATTERN.search(b',' + item[1:])
+                if match:
+                    self._add(match.group(1))
+                return
+        elif indent == self._item_indent:
+            item = stripped
+        else:
+            return
+        match = NODE_YAML_TYPE_PATTERN.match(item)
+        if match:
+            self._add(match.group(1))
+
+    def _add(self, protocol: bytes) -> None:
+        name = protocol.decode('ascii', 'replace').lower()
+        name = PROTOCOL_ALIASES.get(name, name)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+class _TTLCache:
+    """带过期时间的有界LRU缓存，超过 max_size 时淘汰最久未使用的条目"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (过期时间, 值)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key: str, value, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+class _HostScheduler:
+    """按面板主机排队：限制同时进行的请求数，并保证相邻两次请求至少间隔 min_interval 秒"""
+
+    def __init__(self, max_inflight: int, min_interval: float):
+        self.max_inflight = max_inflight
+        self.min_interval = min_interval
+        self._hosts: Dict[str, list] = {}  # host -> [信号量, 下次可发起请求的时间, 使用者数]
+
+    def _state(self, host: str) -> list:
+        state = self._hosts.get(host)
+        if state is None:
+            # 新主机加入时顺便清理已空闲的主机
+            now = time.monotonic()
+            for key in [k for k, v in self._hosts.items() if v[2] == 0 and v[1] <= now]:
+                del self._hosts[key]
+            state = self._hosts[host] = [asyncio.Semaphore(self.max_inflight), 0.0, 0]
+        return state
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str):
+        state = self._state(host)
+        state[2] += 1
+        try:
+            async with state[0]:
+                now = time.monotonic()
+                start = max(now, state[1])
+                state[1] = start + self.min_interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+                yield
+        finally:
+            state[2] -= 1
+
 class SubInfoModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "订阅链接信息查询"
         self.description = "识别订阅链接并获取流量信息和机场名称"
-        self.version = "1.1.0"
+        self.version = "1.9.4"
         self.author = "@zhetengsha"
         self.client = None
         self.dependencies_installed = False
+        self.max_concurrency = 10  # 同时处理的最大链接数
+        self.per_host_limit = 4  # 同一主机的最大并发连接数
+        self.probe_timeout = aiohttp.ClientTimeout(total=10)
+        self.body_timeout = aiohttp.ClientTimeout(total=60)  # 统计节点时下载订阅内容的超时
+        self.session = None
+        self._semaphore = None
+        
+        # 同一面板主机的礼貌调度：最大并发请求数与相邻请求的最小间隔（秒）
+        self.host_max_inflight = 2
+        self.host_min_interval = 0.5
+        self.host_scheduler = _HostScheduler(self.host_max_inflight, self.host_min_interval)
+        
+        # 订阅响应头与节点统计按规范化后的链接短时缓存（秒），重复链接与短时间内的重复查询不再请求
+        self.probe_cache_ttl = 60
+        self.probe_cache_size = 1024  # 缓存条目上限，超出时淘汰最久未使用的
+        self._probe_cache = _TTLCache(self.probe_cache_size)  # url -> (状态码, 响应头)
+        self._probe_pending: Dict[str, asyncio.Future] = {}
+        self._node_cache = _TTLCache(self.probe_cache_size)  # url -> (统计器, 是否截断)
+        self._node_pending: Dict[str, asyncio.Future] = {}
+        
+        # 机场名称按面板主机缓存（秒），获取失败的结果缓存时间较短
+        self.name_cache_ttl = 3600
+        self.name_fail_ttl = 300
+        self._name_cache: Dict[str, tuple] = {}  # host -> (过期时间, 名称)
+        self._name_pending: Dict[str, asyncio.Future] = {}
+        
+        # 订阅监控：后台按间隔（带随机抖动）批量检查，超过阈值时提醒
+        self.watch_store = _WatchStore(WATCH_DB_FILE)
+        self.watch_interval = 3600  # 每个订阅的检查间隔（秒）
+        self.watch_jitter = 0.1  # 间隔的随机抖动比例，避免同时检查
+        self.watch_tick = 60  # 调度器检查到期订阅的间隔（秒）
+        self.watch_batch = 200  # 每批检查的订阅数
+        self.watch_usage_alerts = (80, 90, 95)  # 已用流量百分比提醒阈值
+        self.watch_expire_days = 3  # 到期前几天提醒
+        self._watch_task = None
+        
+        self.bulk_max_messages = 5000  # 批量模式最多扫描的历史消息数
+        self.bulk_read_lines = 2000  # 批量模式读取文件时每次在工作线程中处理的行数
 
     def get_commands(self) -> Dict[str, str]:
         return {
@@ -57,16 +364,55 @@ class SubInfoModule(BaseModule):
             "<b>用法</b>\n"
             "• 回复包含订阅链接的消息：<code>,subinfo</code>\n"
             "• 直接使用：<code>,subinfo 订阅链接</code>\n"
+            "• 同时统计节点数量与协议：<code>,subinfo -n 订阅链接</code>\n"
+            "• 监控订阅：<code>,subinfo watch 订阅链接</code>\n"
+            "• 监控列表：<code>,subinfo watch</code>\n"
+            "• 取消监控：<code>,subinfo unwatch 编号</code>\n"
+            "• 批量检测：回复文件 <code>,subinfo bulk [csv|json]</code>\n"
+            "• 批量检测最近N条消息：<code>,subinfo bulk N [csv|json]</code>\n"
         )
 
     async def module_loaded(self, client) -> None:
         self.client = client
+        try:
+            if self.watch_store.count():
+                self._start_watcher()
+        except sqlite3.Error:
+            pass
 
     async def module_unloaded(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        self.watch_store.close()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
         self.client = None
 
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """获取共享的连接池会话（懒加载）"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency * 2,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
     async def handle_command(self, command: str, event: NewMessage.Event, args: List[str]) -> None:       
         if command == "subinfo":
+            if args and args[0] == "watch":
+                await self._handle_watch(event, args[1:])
+                return
+            if args and args[0] == "bulk":
+                await self._handle_bulk(event, args[1:])
+                return
+            if args and args[0] == "unwatch":
+                await self._handle_unwatch(event, args[1:])
+                return
             await self._handle_subinfo(event, args)
 
     @staticmethod
@@ -114,16 +460,16 @@ class SubInfoModule(BaseModule):
             if "&flag=clash" not in url:
                 url += "&flag=clash"
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        header = response.headers.get('Content-Disposition', '')
-                        pattern = r"filename\*=UTF-8''(.+)"
-                        result = re.search(pattern, header)
-                        if result:
-                            filename = result.group(1)
-                            filename = unquote(filename)
-                            airport_name = filename.replace("%20", " ").replace("%2B", "+")
-                            return airport_name
+                session = self._get_session()
+                async with self.host_scheduler.slot(urlparse(url).hostname or ''), session.get(url) as response:
+                    header = response.headers.get('Content-Disposition', '')
+                    pattern = r"filename\*=UTF-8''(.+)"
+                    result = re.search(pattern, header)
+                    if result:
+                        filename = result.group(1)
+                        filename = unquote(filename)
+                        airport_name = filename.replace("%20", " ").replace("%2B", "+")
+                        return airport_name
             except:
                 return '未知'
         else:
@@ -133,28 +479,433 @@ class SubInfoModule(BaseModule):
                 match = re.search(pattern, url)
                 base_url = match.group(1) + match.group(2) if match else url
                 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f"{base_url}/auth/login", headers=headers, timeout=5) as response:
-                        if response.status != 200:
-                            async with session.get(base_url, headers=headers, timeout=5) as alt_response:
-                                html = await alt_response.text()
-                        else:
-                            html = await response.text()
-                        
-                        soup = BeautifulSoup(html, 'html.parser')
-                        title = soup.title.string if soup.title else "未知"
-                        title = str(title).replace('登录 — ', '')
-                        
-                        if "Attention Required! | Cloudflare" in title:
-                            return '该域名仅限国内IP访问'
-                        elif "Access denied" in title or "404 Not Found" in title:
-                            return '该域名非机场面板域名'
-                        elif "Just a moment" in title:
-                            return '该域名开启了5s盾'
-                        return title
+                session = self._get_session()
+                async with self.host_scheduler.slot(urlparse(base_url).hostname or ''), \
+                        session.get(f"{base_url}/auth/login", headers=headers, timeout=5) as response:
+                    if response.status != 200:
+                        async with session.get(base_url, headers=headers, timeout=5) as alt_response:
+                            title = await self._read_title(alt_response)
+                    else:
+                        title = await self._read_title(response)
+                    
+                    title = (title or "未知").replace('登录 — ', '')
+                    
+                    if "Attention Required! | Cloudflare" in title:
+                        return '该域名仅限国内IP访问'
+                    elif "Access denied" in title or "404 Not Found" in title:
+                        return '该域名非机场面板域名'
+                    elif "Just a moment" in title:
+                        return '该域名开启了5s盾'
+                    return title
             except:
                 return '未知'
 
+    async def _read_title(self, response):
+        """流式读取页面开头，读到 </title> 或达到上限即停止，返回解码后的标题（没有时返回None）"""
+        buf = bytearray()
+        match = None
+        async for chunk in response.content.iter_chunked(4096):
+            buf += chunk
+            match = TITLE_PATTERN.search(buf)
+            if match or len(buf) >= TITLE_READ_LIMIT:
+                break
+        response.close()  # 剩余内容不再下载
+        if match is None:
+            return None
+        
+        # 编码：响应头 > <meta charset> > UTF-8
+        charset = response.charset
+        if not charset:
+            meta = META_CHARSET_PATTERN.search(buf, 0, match.start())
+            charset = meta.group(1).decode('ascii') if meta else 'utf-8'
+        try:
+            title = match.group(1).decode(charset, errors='replace')
+        except LookupError:
+            title = match.group(1).decode('utf-8', errors='replace')
+        return html.unescape(" ".join(title.split())) or None
+
+    async def _get_airport_name(self, url: str):
+        """带缓存的机场名称查询：同一面板主机在TTL内只查询一次，并发请求共享同一次查询"""
+        source = url
+        while "sub?target=" in source:
+            match = re.search(r"url=([^&]*)", source)
+            if not match:
+                break
+            source = unquote(match.group(1))
+        host = urlparse(source).netloc.lower()
+        
+        cached = self._name_cache.get(host)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        
+        pending = self._name_pending.get(host)
+        if pending is None:
+            pending = self._name_pending[host] = asyncio.ensure_future(self.get_filename_from_url(url))
+            pending.add_done_callback(lambda fut: self._store_airport_name(host, fut))
+        return await asyncio.shield(pending)
+
+    def _store_airport_name(self, host: str, fut: asyncio.Future) -> None:
+        self._name_pending.pop(host, None)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        name = fut.result()
+        ttl = self.name_cache_ttl if name and name != '未知' else self.name_fail_ttl
+        self._name_cache[host] = (time.time() + ttl, name)
+
+    @staticmethod
+    def _parse_userinfo(info: str) -> Optional[Dict[str, int]]:
+        """解析 subscription-userinfo，缺少总量时返回None"""
+        fields = {k.lower(): int(v) for k, v in re.findall(r'(\w+)\s*=\s*(\d+)', info or '')}
+        if 'total' not in fields:
+            return None
+        return {
+            'used': fields.get('upload', 0) + fields.get('download', 0),
+            'total': fields['total'],
+            'expire': fields.get('expire') or None,
+        }
+
+    @staticmethod
+    def _format_date(ts: float) -> str:
+        return time.strftime("%Y-%m-%d", time.localtime(ts + 28800))
+
+    async def _handle_watch(self, event: NewMessage.Event, args: List[str]) -> None:
+        """添加监控或列出当前聊天的监控"""
+        if not args:
+            await self._list_watches(event)
+            return
+        url = args[0]
+        if not re.match(r"https?://", url):
+            await event.edit("❌ 请提供有效的订阅链接", parse_mode='html')
+            return
+        
+        await event.edit("🔍 正在检查订阅...", parse_mode='html')
+        try:
+            airport_name = await self._get_airport_name(url)
+            watch_id = self.watch_store.add(event.chat_id, url, airport_name)
+            self._start_watcher()
+            
+            # 立即检查一次，记录第一个样本点
+            row = next(r for r in self.watch_store.list(event.chat_id) if r['id'] == watch_id)
+            self._get_session()
+            update, alerts = await self._check_watch(row)
+            self.watch_store.save([update])
+        except sqlite3.Error as e:
+            await event.edit(f"❌ 监控数据库错误: {str(e)}", parse_mode='html')
+            return
+        if update['error']:
+            state = f"⚠️ 首次检查失败: {update['error']}"
+        else:
+            state = f"💾 已用 {self.StrOfSize(update['used'])} / {self.StrOfSize(update['total'])}"
+        await event.edit(
+            f"👀 已添加监控 #{watch_id}: <code>{airport_name}</code>\n{state}\n"
+            f"每 {self.watch_interval // 60} 分钟检查一次",
+            parse_mode='html'
+        )
+        for alert in alerts:
+            await self._send_alert(event.chat_id, alert)
+
+    async def _handle_unwatch(self, event: NewMessage.Event, args: List[str]) -> None:
+        if not args or not args[0].isdigit():
+            await event.edit(self.get_command_usage("subinfo"), parse_mode='html')
+            return
+        if self.watch_store.remove(event.chat_id, int(args[0])):
+            await event.edit(f"🗑️ 已取消监控 #{args[0]}", parse_mode='html')
+        else:
+            await event.edit(f"❌ 未找到监控 #{args[0]}", parse_mode='html')
+
+    async def _list_watches(self, event: NewMessage.Event) -> None:
+        rows = self.watch_store.list(event.chat_id)
+        if not rows:
+            await event.edit("📭 当前聊天没有监控的订阅", parse_mode='html')
+            return
+        blocks = [self._render_watch(row) for row in rows]
+        await event.edit("\n".join(blocks), parse_mode='html')
+
+    def _render_watch(self, row) -> str:
+        lines = [f"<b>#{row['id']}</b> ✈️ <code>{row['name']}</code>"]
+        if row['total']:
+            remaining = max(row['total'] - row['used'], 0)
+            lines.append(
+                f"💾 已用 {self.StrOfSize(row['used'])} / {self.StrOfSize(row['total'])}"
+                f" ({row['used'] * 100 // row['total']}%)"
+            )
+            if row['rate'] > 0:
+                runout = (row['last_check'] or time.time()) + remaining / row['rate']
+                lines.append(
+                    f"📈 日均 {self.StrOfSize(int(row['rate'] * 86400))}，预计 {self._format_date(runout)} 用完"
+                )
+        if row['expire']:
+            lines.append(f"⏳ 到期: {self._format_date(row['expire'])}")
+        if row['error']:
+            lines.append(f"⚠️ 最近一次检查失败: {row['error']}")
+        return "<blockquote>" + "\n".join(lines) + "</blockquote>"
+
+    def _start_watcher(self) -> None:
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.ensure_future(self._watch_loop())
+
+    async def _watch_loop(self) -> None:
+        """后台调度：定期取出到期的订阅分批并发检查"""
+        while True:
+            try:
+                await self._poll_due_watches()
+            except Exception:
+                pass
+            await asyncio.sleep(self.watch_tick)
+
+    async def _poll_due_watches(self) -> None:
+        self._get_session()
+        while True:
+            rows = self.watch_store.due(time.time(), self.watch_batch)
+            if not rows:
+                return
+            results = await asyncio.gather(*(self._check_watch_limited(row) for row in rows))
+            self.watch_store.save([update for update, _ in results])
+            for row, (_, alerts) in zip(rows, results):
+                for alert in alerts:
+                    await self._send_alert(row['chat_id'], alert)
+            if len(rows) < self.watch_batch:
+                return
+
+    async def _check_watch_limited(self, row):
+        async with self._semaphore:
+            return await self._check_watch(row)
+
+    async def _check_watch(self, row):
+        """检查一个监控的订阅，返回 (待写回的字段, 提醒列表)；速率按时间加权指数平滑增量更新"""
+        now = time.time()
+        interval = self.watch_interval * random.uniform(1 - self.watch_jitter, 1 + self.watch_jitter)
+        update = {
+            'id': row['id'], 'used': row['used'], 'total': row['total'], 'expire': row['expire'],
+            'rate': row['rate'] or 0.0, 'alerted': row['alerted'] or 0,
+            'last_check': row['last_check'], 'next_check': now + interval, 'error': None,
+        }
+        try:
+            status, headers = await self._probe_headers(row['url'])
+            info = self._parse_userinfo(headers.get('subscription-userinfo', '')) if status == 200 else None
+        except Exception as e:
+            update['error'] = str(e) or type(e).__name__
+            return update, []
+        if info is None:
+            update['error'] = f"HTTP {status}" if status != 200 else "无流量信息"
+            return update, []
+        
+        prev_used, prev_check = row['used'], row['last_check']
+        if prev_used is not None and prev_check and info['used'] >= prev_used:
+            dt = now - prev_check
+            if dt > 0:
+                weight = 1 - math.exp(-dt / RATE_WINDOW)
+                update['rate'] += weight * ((info['used'] - prev_used) / dt - update['rate'])
+        elif prev_used is not None and info['used'] < prev_used:
+            # 用量下降说明流量已重置，重新开始统计
+            update['rate'] = 0.0
+            update['alerted'] = 0
+        
+        update['sample'] = (info['used'], info['total'], info['expire']) != (row['used'], row['total'], row['expire'])
+        update.update(info)
+        update['last_check'] = now
+        
+        # 每个阈值只提醒一次（alerted 按位记录），同时越过多个阈值时只发一条
+        alerts = []
+        name = row['name']
+        total, used = info['total'], info['used']
+        remaining = max(total - used, 0)
+        crossed = False
+        for level, threshold in enumerate(self.watch_usage_alerts):
+            bit = 1 << level
+            if total and used * 100 >= total * threshold and not update['alerted'] & bit:
+                update['alerted'] |= bit
+                crossed = True
+        if crossed:
+            text = f"⚠️ 订阅 <code>{name}</code> 流量已用 {used * 100 // total}%，剩余 {self.StrOfSize(remaining)}"
+            if update['rate'] > 0:
+                text += f"，预计 {self._format_date(now + remaining / update['rate'])} 用完"
+            alerts.append(text)
+        expire_bit = 1 << len(self.watch_usage_alerts)
+        expire = info['expire']
+        if expire and row['expire'] and expire > row['expire']:
+            # 到期时间后移说明已续费，续费后的新周期重新提醒
+            update['alerted'] &= ~expire_bit
+        if expire and now <= expire <= now + self.watch_expire_days * 86400 and not update['alerted'] & expire_bit:
+            update['alerted'] |= expire_bit
+            alerts.append(f"⏳ 订阅 <code>{name}</code> 将于 {self._format_date(expire)} 到期")
+        return update, alerts
+
+    async def _send_alert(self, chat_id: int, text: str) -> None:
+        if self.client is None:
+            return
+        try:
+            await self.client.send_message(chat_id, text, parse_mode='html')
+        except Exception:
+            pass
+
+    async def _handle_bulk(self, event: NewMessage.Event, args: List[str]) -> None:
+        """批量检测：从回复的文件或最近N条消息中提取链接，去重后并发检测并上传排序后的报告"""
+        fmt = 'json' if 'json' in args else 'csv'
+        limit = next((int(a) for a in args if a.isdigit()), None)
+        reply_msg = await event.get_reply_message() if event.is_reply else None
+        from_document = reply_msg is not None and isinstance(reply_msg.media, MessageMediaDocument)
+        if not from_document and not limit:
+            await event.edit(self.get_command_usage("subinfo"), parse_mode='html')
+            return
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                if from_document:
+                    input_path = os.path.join(tmp_dir, "input")
+                    await event.edit("⏬ 正在下载文件...", parse_mode='html')
+                    await reply_msg.download_media(file=input_path)
+                    source = self._iter_file_urls(input_path)
+                else:
+                    limit = min(limit, self.bulk_max_messages)
+                    source = self._iter_message_urls(event.chat_id, limit, event.id)
+                
+                db = sqlite3.connect(os.path.join(tmp_dir, "results.db"))
+                try:
+                    checked = await self._run_bulk(event, source, db)
+                    if not checked:
+                        await event.edit("❌ 未检测到订阅链接", parse_mode='html')
+                        return
+                    report_path = os.path.join(tmp_dir, f"subinfo_report.{fmt}")
+                    available = self._write_bulk_report(db, report_path, fmt)
+                finally:
+                    db.close()
+                
+                summary = f"📊 共检测 {checked} 个订阅，{available} 个可用"
+                await event.reply(summary, file=report_path, parse_mode='html')
+                await event.edit(summary, parse_mode='html')
+        except Exception as e:
+            await event.edit(f"❌ 批量检测失败: {str(e)}", parse_mode='html')
+
+    async def _iter_file_urls(self, path: str):
+        """读文件与提取链接都在工作线程中按块进行，避免大文件阻塞事件循环"""
+        f = await asyncio.to_thread(open, path, 'r', encoding='utf-8', errors='replace')
+        try:
+            eof = False
+            while not eof:
+                urls, eof = await asyncio.to_thread(self._read_file_urls, f, self.bulk_read_lines)
+                for url in urls:
+                    yield url
+        finally:
+            f.close()
+
+    @staticmethod
+    def _read_file_urls(f, max_lines: int):
+        """读取至多 max_lines 行并提取其中的链接，返回 (链接列表, 是否已读到文件末尾)"""
+        urls = []
+        for _ in range(max_lines):
+            line = f.readline()
+            if not line:
+                return urls, True
+            urls.extend(URL_PATTERN.findall(line))
+        return urls, False
+
+    async def _iter_message_urls(self, chat_id: int, limit: int, exclude_id: int):
+        async for message in self.client.iter_messages(chat_id, limit=limit):
+            if message.id == exclude_id or not message.text:
+                continue
+            for url in URL_PATTERN.findall(message.text):
+                yield url
+
+    async def _run_bulk(self, event: NewMessage.Event, source, db: sqlite3.Connection) -> int:
+        """链接经有界队列分发给固定数量的worker，结果写入临时SQLite表，内存只与并发窗口有关"""
+        db.execute(
+            "CREATE TABLE results (url TEXT, name TEXT, status TEXT, used INTEGER, total INTEGER,"
+            " remaining INTEGER, expire INTEGER, error TEXT)"
+        )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        stats = {'queued': 0, 'done': 0}
+        last_edit = time.monotonic()
+        self._get_session()
+        
+        async def produce() -> None:
+            seen = set()  # 只保存摘要，减少长链接的内存占用
+            async for url in source:
+                digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                stats['queued'] += 1
+                await queue.put(url)
+            for _ in range(self.max_concurrency):
+                await queue.put(None)
+        
+        async def work() -> None:
+            nonlocal last_edit
+            while True:
+                url = await queue.get()
+                if url is None:
+                    return
+                db.execute("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", await self._bulk_check(url))
+                stats['done'] += 1
+                if time.monotonic() - last_edit > 3:
+                    last_edit = time.monotonic()
+                    try:
+                        await event.edit(f"🔍 已检测 {stats['done']}/{stats['queued']} 个订阅...", parse_mode='html')
+                    except Exception:
+                        pass
+        
+        tasks = [asyncio.ensure_future(produce())]
+        tasks.extend(asyncio.ensure_future(work()) for _ in range(self.max_concurrency))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        db.commit()
+        return stats['done']
+
+    async def _bulk_check(self, url: str) -> tuple:
+        """检测单个链接，返回写入结果表的一行"""
+        name_task = asyncio.ensure_future(self._get_airport_name(url))
+        try:
+            status, headers = await self._probe_headers(url)
+        except Exception as e:
+            name_task.cancel()
+            return (url, None, 'error', None, None, None, None, str(e) or type(e).__name__)
+        if status != 200:
+            name_task.cancel()
+            return (url, None, 'error', None, None, None, None, f"HTTP {status}")
+        name = await name_task
+        info = self._parse_userinfo(headers.get('subscription-userinfo', ''))
+        if info is None:
+            return (url, name, 'no_info', None, None, None, None, None)
+        remaining = max(info['total'] - info['used'], 0)
+        expired = info['expire'] is not None and info['expire'] < time.time()
+        status = 'expired' if expired else ('exhausted' if remaining == 0 else 'ok')
+        return (url, name, status, info['used'], info['total'], remaining, info['expire'], None)
+
+    def _write_bulk_report(self, db: sqlite3.Connection, path: str, fmt: str) -> int:
+        """按可用性、剩余流量、到期时间排序后流式写出报告，返回可用订阅数"""
+        now = time.time()
+        rows = db.execute(
+            "SELECT url, name, status, used, total, remaining, expire, error FROM results"
+            " ORDER BY status != 'ok', remaining IS NULL, remaining DESC, expire IS NULL, expire"
+        )
+        available = 0
+        with open(path, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='') as f:
+            writer = csv.writer(f) if fmt == 'csv' else None
+            if writer:
+                writer.writerow(REPORT_FIELDS)
+            else:
+                f.write('[')
+            for i, (url, name, status, used, total, remaining, expire, error) in enumerate(rows):
+                available += status == 'ok'
+                record = {
+                    'url': url, 'name': name, 'status': status, 'used': used, 'total': total,
+                    'remaining': remaining,
+                    'expire': self._format_date(expire) if expire else None,
+                    'days_left': int((expire - now) // 86400) if expire else None,
+                    'error': error,
+                }
+                if writer:
+                    writer.writerow(['' if record[k] is None else record[k] for k in REPORT_FIELDS])
+                else:
+                    f.write((',\n' if i else '\n') + json.dumps(record, ensure_ascii=False))
+            if not writer:
+                f.write('\n]\n')
+        return available
+
     async def _handle_subinfo(self, event: NewMessage.Event, args: List[str]):
         """处理订阅信息查询"""
         try:
@@ -170,75 +921,172 @@ class SubInfoModule(BaseModule):
                 return
                 
             # 提取URL
-            url_list = re.findall(
-                r"https?://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]",
-                message_raw
-            )
+            url_list = URL_PATTERN.findall(message_raw)
             
             if not url_list:
                 await event.edit("❌ 未检测到订阅链接", parse_mode='html')
                 return
-                
-            final_output = ""
-            headers = {'User-Agent': 'ClashforWindows/0.18.1'}
             
-            for url in url_list:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, headers=headers, timeout=10) as res:
-                            # 处理重定向
-                            while res.status in (301, 302):
-                                redirect_url = res.headers.get('Location')
-                                if not redirect_url:
-                                    break
-                                async with session.get(redirect_url, headers=headers, timeout=10) as new_res:
-                                    res = new_res
-                            
-                            if res.status == 200:
-                                info = res.headers.get('subscription-userinfo', '')
-                                airport_name = await self.get_filename_from_url(url)
-                                
-                                if info:
-                                    info_num = re.findall(r'\d+', info)
-                                    if len(info_num) >= 3:
-                                        time_now = int(time.time())
-                                        used_up = int(info_num[0])
-                                        used_down = int(info_num[1])
-                                        total = int(info_num[2])
-                                        remaining = total - used_up - used_down
-                                        
-                                        output_text = (
-                                            f"<blockquote><b>✈️ 机场名称</b>: <code>{airport_name}</code>\n"
-                                            f"<b>🔗 订阅链接</b>: <code>{url}</code>\n"
-                                            f"<b>⬆️ 已用上行</b>: {self.StrOfSize(used_up)}\n"
-                                            f"<b>⬇️ 已用下行</b>: {self.StrOfSize(used_down)}\n"
-                                            f"<b>🔄 剩余流量</b>: {self.StrOfSize(remaining)}\n"
-                                            f"<b>💾 总流量</b>: {self.StrOfSize(total)}\n"
-                                        )
-                                        
-                                        # 处理过期时间
-                                        if len(info_num) >= 4:
-                                            expire_time = int(info_num[3])
-                                            time_str = time.strftime("%Y-%m-%d", time.localtime(expire_time + 28800))
-                                            
-                                            if time_now <= expire_time:
-                                                last_time = expire_time - time_now
-                                                output_text += f"<b>⏳ 有效期至</b>: {time_str} (剩余 {self.sec_to_data(last_time)})</blockquote>"
-                                            else:
-                                                output_text += f"<b>❌ 已过期</b>: {time_str}</blockquote>"
-                                        else:
-                                            output_text += "<b>⏳ 有效期</b>: 未知</blockquote>"
-                                        
-                                        final_output += output_text + "\n"
-                                    else:
-                                        final_output += f"<blockquote><b>✈️ 机场名称</b>: {airport_name}\n<b>🔗 链接</b>: <code>{url}</code>\n<b>⚠️ 流量信息格式错误</b></blockquote>\n"
-                                else:
-                                    final_output += f"<blockquote><b>✈️ 机场名称</b>: {airport_name}\n<b>🔗 链接</b>: <code>{url}</code>\n<b>ℹ️ 无流量信息</b></blockquote>\n"
-                            else:
-                                final_output += f"<b>🔗 链接</b>: <code>{url}</code>\n<b>❌ 无法访问 (HTTP {res.status})</b>\n"
-                except Exception as e:
-                    final_output += f"<b>🔗 链接</b>: <code>{url}</code>\n<b>⚠️ 处理错误: {str(e)}</b>\n\n"
+            # 所有链接共用连接池并发查询，结果按输入顺序拼接
+            self._get_session()
+            count_nodes = "-n" in args
+            results = await asyncio.gather(*(self._query_subscription_limited(url, count_nodes) for url in url_list))
+            final_output = "".join(results)
             
             await event.edit(final_output if final_output else "❌ 未获取到有效信息", parse_mode='html')
         except Exception as e:
             await event.edit(f"❌ 处理出错: {str(e)}", parse_mode='html')
+
+    async def _query_subscription_limited(self, url: str, count_nodes: bool = False) -> str:
+        async with self._semaphore:
+            return await self._query_subscription(url, count_nodes)
+
+    async def _query_subscription(self, url: str, count_nodes: bool = False) -> str:
+        """查询单个订阅链接，返回渲染好的结果文本"""
+        # 机场名称、流量信息（以及节点统计）同时查询
+        tasks = [asyncio.ensure_future(self._get_airport_name(url))]
+        if count_nodes:
+            tasks.append(asyncio.ensure_future(self._shared_fetch(self._node_cache, self._node_pending,
+                                                                  url, self._count_nodes)))
+        try:
+            status, res_headers = await self._probe_headers(url)
+            if status != 200:
+                return f"<b>🔗 链接</b>: <code>{url}</code>\n<b>❌ 无法访问 (HTTP {status})</b>\n"
+            
+            info = res_headers.get('subscription-userinfo', '')
+            airport_name = await tasks[0]
+            extra = ""
+            if count_nodes:
+                try:
+                    extra = self._render_nodes(*await tasks[1])
+                except Exception as e:
+                    extra = f"<b>⚠️ 节点统计失败</b>: {html.escape(str(e) or type(e).__name__)}\n"
+            return self._render_subscription(url, airport_name, info, extra)
+        except Exception as e:
+            return f"<b>🔗 链接</b>: <code>{url}</code>\n<b>⚠️ 处理错误: {str(e)}</b>\n\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _count_nodes(self, url: str):
+        """流式下载订阅内容并边读边统计节点，超过 NODE_READ_LIMIT 即停止；返回 (统计器, 是否截断)"""
+        counter = _NodeCounter()
+        received = 0
+        truncated = False
+        headers = {'User-Agent': 'ClashforWindows/0.18.1'}
+        session = self._get_session()
+        async with self.host_scheduler.slot(urlparse(url).hostname or ''), \
+                session.get(url, headers=headers, timeout=self.body_timeout) as res:
+            if res.status != 200:
+                raise ValueError(f"HTTP {res.status}")
+            async for chunk in res.content.iter_chunked(64 * 1024):
+                received += len(chunk)
+                if received > NODE_READ_LIMIT:
+                    truncated = True
+                    res.close()
+                    break
+                counter.feed(chunk)
+        counter.close()
+        return counter, truncated
+
+    @staticmethod
+    def _render_nodes(counter: _NodeCounter, truncated: bool) -> str:
+        if not counter.total:
+            return "<b>🌐 节点数量</b>: 未识别到节点\n"
+        note = f"（内容超过 {NODE_READ_LIMIT // 1024 // 1024}MB，仅统计前面部分）" if truncated else ""
+        breakdown = " · ".join(
+            f"{name} {count}" for name, count in sorted(counter.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        )
+        return f"<b>🌐 节点数量</b>: {counter.total}{note}\n<b>📡 协议分布</b>: {html.escape(breakdown)}\n"
+
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        """缓存键：协议和主机小写、去掉默认端口和片段、查询参数排序"""
+        parts = urlparse(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        default_port = {'http': ':80', 'https': ':443'}.get(scheme)
+        if default_port and netloc.endswith(default_port):
+            netloc = netloc[:-len(default_port)]
+        query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+        return f"{scheme}://{netloc}{parts.path or '/'}" + (f"?{query}" if query else '')
+
+    async def _probe_headers(self, url: str):
+        """带缓存的响应头查询，返回 (状态码, 响应头)"""
+        return await self._shared_fetch(self._probe_cache, self._probe_pending, url, self._fetch_headers)
+
+    async def _shared_fetch(self, cache: _TTLCache, pending_map: Dict[str, asyncio.Future], url: str, fetch):
+        """按规范化后的链接：TTL内直接返回缓存，同一链接的并发请求共享同一次 fetch(url)"""
+        key = self._normalize_url(url)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        
+        pending = pending_map.get(key)
+        if pending is None:
+            pending = pending_map[key] = asyncio.ensure_future(fetch(url))
+            pending.add_done_callback(lambda fut: self._store_fetched(cache, pending_map, key, fut))
+        return await asyncio.shield(pending)
+
+    def _store_fetched(self, cache: _TTLCache, pending_map: Dict[str, asyncio.Future],
+                       key: str, fut: asyncio.Future) -> None:
+        pending_map.pop(key, None)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        cache.set(key, fut.result(), self.probe_cache_ttl)
+
+    async def _fetch_headers(self, url: str):
+        """只获取订阅的响应头：先 HEAD，不支持或缺少流量信息时改用 GET 并在收到响应头后立即断开；重定向在连接池内自动跟随"""
+        headers = {'User-Agent': 'ClashforWindows/0.18.1'}
+        session = self._get_session()
+        async with self.host_scheduler.slot(urlparse(url).hostname or ''):
+            try:
+                async with session.head(url, headers=headers, timeout=self.probe_timeout, allow_redirects=True) as res:
+                    if res.status == 200 and 'subscription-userinfo' in res.headers:
+                        return res.status, res.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            
+            async with session.get(url, headers=headers, timeout=self.probe_timeout, allow_redirects=True) as res:
+                res.close()  # 不读取订阅内容
+                return res.status, res.headers
+
+    def _render_subscription(self, url: str, airport_name: str, info: str, extra: str = "") -> str:
+        """根据 subscription-userinfo 渲染流量信息，extra 附加在引用块末尾"""
+        extra = "\n" + extra.rstrip("\n") if extra else ""
+        if not info:
+            return f"<blockquote><b>✈️ 机场名称</b>: {airport_name}\n<b>🔗 链接</b>: <code>{url}</code>\n<b>ℹ️ 无流量信息</b>{extra}</blockquote>\n"
+        
+        info_num = re.findall(r'\d+', info)
+        if len(info_num) < 3:
+            return f"<blockquote><b>✈️ 机场名称</b>: {airport_name}\n<b>🔗 链接</b>: <code>{url}</code>\n<b>⚠️ 流量信息格式错误</b>{extra}</blockquote>\n"
+        
+        time_now = int(time.time())
+        used_up = int(info_num[0])
+        used_down = int(info_num[1])
+        total = int(info_num[2])
+        remaining = total - used_up - used_down
+        
+        output_text = (
+            f"<blockquote><b>✈️ 机场名称</b>: <code>{airport_name}</code>\n"
+            f"<b>🔗 订阅链接</b>: <code>{url}</code>\n"
+            f"<b>⬆️ 已用上行</b>: {self.StrOfSize(used_up)}\n"
+            f"<b>⬇️ 已用下行</b>: {self.StrOfSize(used_down)}\n"
+            f"<b>🔄 剩余流量</b>: {self.StrOfSize(remaining)}\n"
+            f"<b>💾 总流量</b>: {self.StrOfSize(total)}\n"
+        )
+        
+        # 处理过期时间
+        if len(info_num) >= 4:
+            expire_time = int(info_num[3])
+            time_str = time.strftime("%Y-%m-%d", time.localtime(expire_time + 28800))
+            
+            if time_now <= expire_time:
+                last_time = expire_time - time_now
+                output_text += f"<b>⏳ 有效期至</b>: {time_str} (剩余 {self.sec_to_data(last_time)})"
+            else:
+                output_text += f"<b>❌ 已过期</b>: {time_str}"
+        else:
+            output_text += "<b>⏳ 有效期</b>: 未知"
+        
+        return output_text + extra + "</blockquote>\n"
@@ -1,6 +1,21 @@
+import os
 import re
-from typing import List, Dict, Tuple
+import sys
+import csv
+import html
+import json
+import math
+import time
+import socket
+import asyncio
+import importlib
+import ipaddress
+import tempfile
+from itertools import islice
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
 from telethon.events import NewMessage
+from telethon.tl.types import MessageMediaDocument
 from urllib.parse import urlparse
 from modules.base_module import BaseModule
 
@@ -14,42 +29,544 @@ def _install_package(package_name: str):
         raise ImportError(f"Failed to install {package_name}")
 
 try:
-    import requests
+    import aiohttp
 except ImportError:
-    _install_package('requests')
-    import requests
+    _install_package('aiohttp')
+    import aiohttp
+
+CACHE_FILE = "./third_party_modules/ip_cache.json"
+MMDB_CITY_FILE = "./third_party_modules/GeoLite2-City.mmdb"
+MMDB_ASN_FILE = "./third_party_modules/GeoLite2-ASN.mmdb"
+MAX_MESSAGE_LENGTH = 4000  # Telegram单条消息上限为4096，预留余量
+# 常见文件扩展名（均不是已分配的顶级域），避免把 report.txt、img.png 之类的文件名当成域名
+FILE_EXTENSIONS = frozenset((
+    'txt', 'log', 'csv', 'json', 'xml', 'yaml', 'yml', 'ini', 'conf', 'cfg', 'html', 'htm', 'js', 'css',
+    'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'svg', 'ico', 'mp3', 'mp4', 'mkv', 'avi', 'wav', 'flac',
+    'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'exe', 'dll', 'bin', 'iso', 'gz', 'tgz', 'tar',
+    'rar', '7z', 'bak', 'tmp', 'jar', 'apk', 'deb', 'rpm', 'db', 'sqlite', 'mmdb',
+))
+# 按文本逐行读取的文件类型，其他文档（视频、贴纸等）仍按消息文字处理
+TEXT_MIME_TYPES = ('application/json', 'application/xml', 'application/csv', 'application/x-ndjson')
+TEXT_FILE_EXTENSIONS = ('.txt', '.log', '.csv', '.tsv', '.json', '.jsonl', '.ndjson', '.xml', '.yaml', '.yml',
+                        '.conf', '.cfg', '.ini', '.list', '.md', '.html', '.htm')
+REPORT_FIELDS = ('line', 'target', 'ip', 'status', 'country', 'countryCode', 'regionName',
+                 'city', 'isp', 'org', 'as', 'message')
+
+class _TTLCache:
+    """带过期时间的LRU缓存，过期时间使用墙上时钟以便持久化"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (expire_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Dict]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expire_at, value = item
+        if expire_at < time.time():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def dump(self, path: str) -> None:
+        """写入磁盘快照（先写临时文件再替换，避免半截文件）"""
+        now = time.time()
+        items = [[k, exp, v] for k, (exp, v) in self._data.items() if exp > now]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """从磁盘快照恢复，跳过已过期条目"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expire_at, value in items[-self.max_size:]:
+            if expire_at > now:
+                self._data[key] = (expire_at, value)
+
+# 可选依赖的导入结果（成功或失败）在进程内只求一次
+_OPTIONAL_IMPORTS: Dict[str, asyncio.Future] = {}
+
+def _load_package(package_name: str):
+    try:
+        return importlib.import_module(package_name)
+    except ImportError:
+        _install_package(package_name)
+        return importlib.import_module(package_name)
+
+async def _import_optional(package_name: str):
+    """导入可选依赖，缺失时在线程中安装，不阻塞事件循环；失败返回None且不再重试"""
+    pending = _OPTIONAL_IMPORTS.get(package_name)
+    if pending is None:
+        pending = _OPTIONAL_IMPORTS[package_name] = asyncio.ensure_future(
+            asyncio.to_thread(_load_package, package_name)
+        )
+    try:
+        return await asyncio.shield(pending)
+    except Exception:
+        return None
+
+# 以路径为键共享的只读mmap数据库读取器，打开失败记为None
+_MMDB_READERS: Dict[str, object] = {}
+
+class _MMDBBackend:
+    """离线查询后端：从本地MaxMind格式数据库(.mmdb)读取地理位置/ASN信息"""
+
+    REQUIRED_FIELDS = ('country', 'as')
+
+    def __init__(self, city_path: Optional[str], asn_path: Optional[str], language: str = 'zh-CN'):
+        self.city_path = city_path
+        self.asn_path = asn_path
+        self.language = language
+
+    async def open(self) -> None:
+        """打开尚未打开的数据库，同一文件在进程内只映射一次，打开失败不再重试"""
+        paths = [p for p in (self.city_path, self.asn_path) if p and p not in _MMDB_READERS and os.path.exists(p)]
+        if not paths:
+            return
+        maxminddb = await _import_optional('maxminddb')
+        for path in paths:
+            try:
+                _MMDB_READERS[path] = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+            except Exception:
+                _MMDB_READERS[path] = None
+
+    def _reader(self, path: Optional[str]):
+        return _MMDB_READERS.get(path) if path else None
+
+    @property
+    def available(self) -> bool:
+        return any(os.path.exists(p) for p in (self.city_path, self.asn_path) if p)
+
+    def _name(self, record: Optional[Dict]) -> str:
+        names = (record or {}).get('names', {})
+        return names.get(self.language) or names.get('en', '')
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """返回ip-api格式的结果（字段可能不全），数据库不可用或无记录时返回None"""
+        data = {}
+        city_reader = self._reader(self.city_path)
+        if city_reader is not None:
+            try:
+                record = city_reader.get(ip)
+            except ValueError:
+                record = None
+            if record:
+                country = record.get('country') or record.get('registered_country')
+                subdivisions = record.get('subdivisions') or [None]
+                location = record.get('location', {})
+                data.update({
+                    'country': self._name(country),
+                    'countryCode': (country or {}).get('iso_code', ''),
+                    'regionName': self._name(subdivisions[0]),
+                    'city': self._name(record.get('city')),
+                    'lat': location.get('latitude'),
+                    'lon': location.get('longitude'),
+                })
+        
+        asn_reader = self._reader(self.asn_path)
+        if asn_reader is not None:
+            try:
+                record = asn_reader.get(ip)
+            except ValueError:
+                record = None
+            if record and record.get('autonomous_system_number'):
+                org = record.get('autonomous_system_organization', '')
+                data.update({
+                    'isp': org,
+                    'org': org,
+                    'as': f"AS{record['autonomous_system_number']} {org}".strip(),
+                })
+        
+        data = {k: v for k, v in data.items() if v not in (None, '')}
+        if not data:
+            return None
+        data.update({'status': 'success', 'query': ip})
+        return data
+
+    def is_complete(self, data: Dict) -> bool:
+        return all(data.get(field) for field in self.REQUIRED_FIELDS)
+
+    @staticmethod
+    def close_all() -> None:
+        for reader in _MMDB_READERS.values():
+            if reader is None:
+                continue
+            try:
+                reader.close()
+            except Exception:
+                pass
+        _MMDB_READERS.clear()
+
+class _DNSResolver:
+    """异步DNS解析：并发查询A/AAAA记录，按记录TTL缓存；aiodns不可用时退回系统解析"""
+
+    def __init__(self, timeout: float = 5, min_ttl: int = 30, max_ttl: int = 3600,
+                 fallback_ttl: int = 300, negative_ttl: int = 60, max_size: int = 1024):
+        self.timeout = timeout
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.fallback_ttl = fallback_ttl  # 系统解析拿不到TTL时使用
+        self.negative_ttl = negative_ttl
+        self.cache = _TTLCache(max_size=max_size)
+        self._resolver = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def _get_resolver(self):
+        if self._resolver is None:
+            aiodns = await _import_optional('aiodns')
+            if self._resolver is None:
+                try:
+                    self._resolver = aiodns.DNSResolver()
+                except Exception:
+                    self._resolver = False
+        return self._resolver or None
+
+    async def resolve(self, name: str) -> List[str]:
+        """返回域名的全部IPv4/IPv6地址（先A后AAAA），解析失败时返回空列表"""
+        name = name.lower()
+        cached = self.cache.get(name)
+        if cached is not None:
+            return cached
+        # 同一域名的并发解析只发起一次
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = self._pending[name] = asyncio.ensure_future(self._resolve(name))
+            pending.add_done_callback(lambda _: self._pending.pop(name, None))
+        return await asyncio.shield(pending)
+
+    async def _resolve(self, name: str) -> List[str]:
+        (v4, ttl4), (v6, ttl6) = await asyncio.gather(self._query(name, 'A'), self._query(name, 'AAAA'))
+        addresses = list(dict.fromkeys(v4 + v6))
+        ttls = [ttl for ttl in (ttl4, ttl6) if ttl is not None]
+        if not addresses:
+            ttl = self.negative_ttl
+        elif ttls:
+            ttl = max(self.min_ttl, min(self.max_ttl, min(ttls)))
+        else:
+            ttl = self.fallback_ttl
+        self.cache.set(name, addresses, ttl)
+        return addresses
+
+    async def _query(self, name: str, qtype: str) -> Tuple[List[str], Optional[int]]:
+        """查询单一记录类型，返回 (地址列表, 最小TTL)"""
+        resolver = await self._get_resolver()
+        try:
+            if resolver is not None:
+                if hasattr(resolver, 'query_dns'):
+                    # aiodns 4.x：query 已弃用，query_dns 返回 pycares 的 DNSResult，
+                    # answer 中可能夹带 CNAME 等记录，只保留带地址的记录
+                    result = await asyncio.wait_for(resolver.query_dns(name, qtype), self.timeout)
+                    records = [(r.data.addr, r.ttl) for r in result.answer if hasattr(r.data, 'addr')]
+                else:
+                    records = await asyncio.wait_for(resolver.query(name, qtype), self.timeout)
+                    records = [(r.host, r.ttl) for r in records]
+                addresses = [str(ipaddress.ip_address(host)) for host, _ in records]
+                return addresses, min((ttl for _, ttl in records), default=None)
+            family = socket.AF_INET if qtype == 'A' else socket.AF_INET6
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(name, None, family=family, type=socket.SOCK_STREAM),
+                self.timeout
+            )
+            return list(dict.fromkeys(str(ipaddress.ip_address(info[4][0])) for info in infos)), None
+        except Exception:
+            return [], None
+
+class _RateLimiter:
+    """令牌桶限速器：按固定速率补充令牌，并根据ip-api返回的 X-Rl/X-Ttl 响应头校准"""
+
+    def __init__(self, rate: int, per: float = 60.0):
+        self.capacity = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = 0  # 已排队但尚未取得令牌的请求数
+        self._lock = None  # 懒加载，避免导入时绑定事件循环
+
+    def _refill(self, now: float) -> None:
+        if self._blocked_until and now >= self._blocked_until:
+            # 服务端窗口已重置
+            self._blocked_until = 0.0
+            self._tokens = float(self.capacity)
+        elif not self._blocked_until:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / self.per)
+        self._updated = now
+
+    def estimate_wait(self, ahead: int = 0) -> float:
+        """前面还有 ahead 个请求排队时，本次请求需要等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        interval = self.per / self.capacity
+        if self._blocked_until:
+            # 窗口重置后令牌补满，超出容量的部分按补充速率继续排队
+            return self._blocked_until - now + max(0, ahead + 1 - self.capacity) * interval
+        return max(0.0, ahead + 1 - self._tokens) * interval
+
+    async def acquire(self, on_wait=None) -> None:
+        """取得一个令牌，所有调用方按先来后到排队；需要等待时同步回调 on_wait(预计秒数)，排队期间会多次回调
+
+        on_wait 在锁内调用，不能阻塞，需要发消息时应另起任务
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        wait = self.estimate_wait(self._waiters)
+        self._waiters += 1
+        try:
+            if wait > 0 and on_wait is not None:
+                on_wait(wait)
+            async with self._lock:
+                while True:
+                    wait = self.estimate_wait()
+                    if wait <= 0:
+                        self._tokens -= 1
+                        return
+                    if on_wait is not None:
+                        on_wait(wait)
+                    await asyncio.sleep(wait)
+        finally:
+            self._waiters -= 1
+
+    def update(self, headers, status: int) -> None:
+        """根据响应头同步剩余配额，配额耗尽或被限流时暂停到窗口重置"""
+        try:
+            remaining = int(headers.get('X-Rl'))
+            reset_in = int(headers.get('X-Ttl'))
+        except (TypeError, ValueError):
+            if status == 429:
+                self._blocked_until = time.monotonic() + self.per
+            return
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = min(self._tokens, float(remaining))
+        if remaining <= 0 or status == 429:
+            self._blocked_until = max(self._blocked_until, now + reset_in)
+
+# ip-api免费接口按来源IP限速，单条接口45次/分钟，批量接口15次/分钟，进程内所有查询共用
+_RATE_LIMITERS: Dict[str, _RateLimiter] = {
+    'json': _RateLimiter(45),
+    'batch': _RateLimiter(15),
+}
+
+class _WaitTracker:
+    """汇总一条命令所有排队请求的预计等待：以最晚的预计完成时间为准，排队期间按间隔刷新剩余时间
+
+    作为限速器的 on_wait 回调同步调用，只登记预计时间；提示消息由 show(剩余秒数) 在独立任务中更新，
+    不会占用限速器的锁
+    """
+
+    def __init__(self, show, interval: float = 5.0):
+        self.show = show
+        self.interval = interval
+        self._deadline = 0.0
+        self._shown_at = None
+        self._task = None
+
+    def __call__(self, wait: float) -> None:
+        self._deadline = max(self._deadline, time.monotonic() + wait)
+        now = time.monotonic()
+        if self._task is not None and not self._task.done():
+            return
+        if self._shown_at is not None and now - self._shown_at < self.interval:
+            return
+        self._shown_at = now
+        self._task = asyncio.ensure_future(self._show())
+
+    async def _show(self) -> None:
+        # 同一条命令的请求在同一轮事件循环中入队，让出一次以便先登记完整个队列
+        await asyncio.sleep(0)
+        remaining = self._deadline - time.monotonic()
+        if remaining < 1:
+            return
+        try:
+            await self.show(math.ceil(remaining))
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """命令结束时取消尚未完成的提示，避免覆盖最终结果"""
+        if self._task is not None:
+            self._task.cancel()
+
+class _ReportWriter:
+    """流式写出批量查询报告（CSV 或 JSON 数组），逐条写入磁盘，不在内存中保留结果"""
+
+    def __init__(self, path: str, fmt: str = 'csv'):
+        self.fmt = fmt
+        self.rows = 0
+        # CSV带BOM，方便Excel直接打开中文内容
+        self._file = open(path, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='')
+        if fmt == 'csv':
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(REPORT_FIELDS)
+        else:
+            self._file.write('[')
+
+    def write(self, row: Dict) -> None:
+        if self.fmt == 'csv':
+            self._csv.writerow([row.get(field, '') for field in REPORT_FIELDS])
+        else:
+            item = {field: row[field] for field in REPORT_FIELDS if row.get(field) not in (None, '')}
+            self._file.write((',\n' if self.rows else '\n') + json.dumps(item, ensure_ascii=False))
+        self.rows += 1
+
+    def close(self) -> None:
+        if self.fmt != 'csv':
+            self._file.write('\n]\n')
+        self._file.close()
+
+class _CoalescedEditor:
+    """合并高频的消息编辑：最多每 interval 秒编辑一次，只发送最新内容"""
+
+    def __init__(self, event: NewMessage.Event, interval: float = 1.5):
+        self.event = event
+        self.interval = interval
+        self._latest = None
+        self._shown = None
+        self._last_edit = time.monotonic()  # 首次编辑也延后，很快完成的查询只编辑最终结果
+        self._task = None
+
+    def update(self, text: str) -> None:
+        if text == self._shown:
+            return
+        self._latest = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self) -> None:
+        while self._latest is not None:
+            delay = self._last_edit + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text, self._latest = self._latest, None
+            if text is None or text == self._shown:
+                return
+            self._shown = text
+            self._last_edit = time.monotonic()
+            try:
+                await self.event.edit(text, parse_mode='html')
+            except Exception:
+                pass
+
+    async def close(self) -> None:
+        """丢弃尚未发出的中间内容，停止后台编辑"""
+        self._latest = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+class _PagedMessage:
+    """逐块追加结果并实时编辑消息，超出长度上限时另起一条新消息"""
+
+    def __init__(self, event: NewMessage.Event):
+        self.event = event
+        self.message = None  # 当前正在编辑的消息
+        self.page = 0
+        self.text = ""
+        self._shown = None
+
+    async def add(self, block: str) -> None:
+        if self.text and len(self.text) + len(block) + 1 > MAX_MESSAGE_LENGTH:
+            # 当前页已满，定稿后换页
+            await self._show(self.text)
+            self.message = None
+            self.page += 1
+            self.text = ""
+        self.text = f"{self.text}\n{block}" if self.text else block
+
+    async def publish(self, footer: str = "") -> None:
+        """显示当前页，footer 仅作为进度提示附在末尾"""
+        text = f"{self.text}\n{footer}" if self.text and footer else (self.text or footer)
+        if text:
+            await self._show(text)
+
+    async def _show(self, text: str) -> None:
+        if self.message is not None and text == self._shown:
+            return
+        if self.message is not None:
+            await self.message.edit(text, parse_mode='html')
+        elif self.page == 0:
+            self.message = await self.event.edit(text, parse_mode='html')
+        else:
+            self.message = await self.event.respond(text, parse_mode='html')
+        self._shown = text
 
 class IPQueryModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "网络信息查询"
         self.description = "查询IP地址或域名的网络信息"
-        self.version = "3.0.0"
+        self.version = "3.10.8"
         self.author = "lanyi233"
         self.client = None
         self.api_endpoint = "http://ip-api.com/json/"
+        self.batch_endpoint = "http://ip-api.com/batch"
         self.timeout = 8
+        self.batch_size = 100  # ip-api批量接口单次最多100个
+        self.max_targets = 500  # 单次命令最多处理的目标数
+        self.max_concurrency = 10  # 同时进行的最大查询数
+        self.stream_results = True  # 多目标查询时边查边显示
+        self.stream_interval = 1.5  # 流式显示时两次编辑的最小间隔（秒）
+        self.file_workers = 4  # 文件批量查询的并发批次数
+        self.max_file_targets = 100000  # 单个文件最多查询的目标数，达到后不再继续读取
+        self.file_read_lines = 2000  # 文件批量查询每次在工作线程中读取并提取的行数
+        self.max_range_lookups = 1024  # 网段查询最多查询的块数
+        # 网段查询按块取代表地址查询一次（IPv4 /24、IPv6 /48 为公网可路由的最小前缀）
+        self.range_prefix = {4: 24, 6: 48}
+        self.session = None
+        self._semaphore = None
         
-        # 健壮的IP匹配正则表达式（支持IPv4和IPv6）
-        self.ip_pattern = re.compile(
-            r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'  # IPv4
-            r'|'  # 或
-            r'(?:(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'  # 标准IPv6
-            r'|'  # 或
-            r'(?:[0-9a-fA-F]{1,4}:){1,7}:'  # 压缩的IPv6
-            r'|'  # 或
-            r'(?:[0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}'  # 部分压缩的IPv6
-            r'|'  # 或
-            r':(?:[0-9a-fA-F]{1,4}:){0,6}[0-9a-fA-F]{1,4}'  # 部分压缩的IPv6
-            r'|'  # 或
-            r'[0-9a-fA-F]{1,4}::[0-9a-fA-F]{1,4})'  # 双冒号压缩的IPv6
-        )
+        # 结果缓存：成功与失败结果分别设置TTL（秒），cache_file 设为 None 可关闭持久化
+        self.cache_ttl = 6 * 3600
+        self.cache_fail_ttl = 10 * 60
+        self.cache_file = CACHE_FILE
+        self.cache = _TTLCache(max_size=2048)
+        self._cache_dirty = False
         
-        # 域名匹配正则表达式
-        self.domain_pattern = re.compile(
-            r'\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9][a-z0-9-]{0,61}[a-z0-9]\b',
-            re.IGNORECASE
-        )
+        # 域名先在本地解析为全部A/AAAA地址再查询，可替换为任何提供 async resolve(name) 的对象；设为 None 则交由ip-api解析
+        self.resolver = _DNSResolver(timeout=self.timeout)
+        
+        # 离线数据库后端，文件存在时优先使用，缺失字段再回退到ip-api
+        self.local_backend = _MMDBBackend(MMDB_CITY_FILE, MMDB_ASN_FILE)
+        
+        # 单次扫描的候选片段：字母数字及 . : - _ / [ ] 组成的连续序列
+        self.token_pattern = re.compile(r'[0-9A-Za-z.:\-_/\[\]]+')
+        
+        # 域名标签
+        self.label_pattern = re.compile(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?', re.IGNORECASE)
 
     def get_commands(self) -> Dict[str, str]:
         return {
@@ -69,22 +586,87 @@ class IPQueryModule(BaseModule):
             "<blockquote>网络信息查询</blockquote>\n\n"
             "<b>使用方法</b>\n"
             "<code>,ip [IP地址/域名]</code>\n"
+            "<code>,ip 203.0.113.0/24</code> 查询网段\n"
+            "<code>,ip 203.0.113.1-203.0.113.99</code> 查询地址范围\n"
+            "回复文件 <code>,ip [csv|json]</code> 批量查询并生成报告\n"
+            "<code>,ip cache</code> 查看缓存统计\n"
+            "<code>,ip cache clear</code> 清空缓存\n"
         )
 
     async def module_loaded(self, client) -> None:
         self.client = client
+        if self.cache_file:
+            self.cache.load(self.cache_file)
 
     async def module_unloaded(self) -> None:
+        self._save_cache()
+        _MMDBBackend.close_all()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
         self.client = None
 
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """获取共享的连接池会话（懒加载）"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
     async def handle_command(self, command: str, event: NewMessage.Event, args: List[str]) -> None:
         if command == "ip":
+            if args and args[0].lower() == "cache":
+                await self._handle_cache_command(event, args[1:])
+                return
             await self._handle_ip_query(event, args)
 
+    async def _handle_cache_command(self, event: NewMessage.Event, args: List[str]) -> None:
+        """查看或清空结果缓存"""
+        if args and args[0].lower() == "clear":
+            self.cache.clear()
+            if isinstance(self.resolver, _DNSResolver):
+                self.resolver.cache.clear()
+            self._cache_dirty = True
+            self._save_cache()
+            await event.edit("🗑️ 已清空IP查询缓存", parse_mode='html')
+            return
+        
+        total = self.cache.hits + self.cache.misses
+        hit_rate = f"{self.cache.hits / total * 100:.1f}%" if total else "-"
+        await event.edit(
+            "<blockquote>IP查询缓存</blockquote>\n\n"
+            f"条目: {len(self.cache)}/{self.cache.max_size}\n"
+            f"命中: {self.cache.hits} / 未命中: {self.cache.misses} (命中率 {hit_rate})\n"
+            f"TTL: 成功 {self.cache_ttl}s / 失败 {self.cache_fail_ttl}s\n"
+            f"DNS缓存: {len(self.resolver.cache) if isinstance(self.resolver, _DNSResolver) else '-'}\n"
+            f"离线数据库: {'已启用' if self.local_backend and self.local_backend.available else '未启用'}",
+            parse_mode='html'
+        )
+
+    def _save_cache(self) -> None:
+        """将缓存快照写入磁盘"""
+        if not self.cache_file or not self._cache_dirty:
+            return
+        try:
+            self.cache.dump(self.cache_file)
+            self._cache_dirty = False
+        except OSError:
+            pass
+
     async def _handle_ip_query(self, event: NewMessage.Event, args: List[str]) -> None:
         # 如果是回复消息模式
         if event.is_reply:
             reply_message = await event.get_reply_message()
+            
+            # 回复文本文件：逐行读取批量查询并上传报告
+            if self._is_text_document(reply_message):
+                await self._handle_file_query(event, reply_message, args)
+                return
+            
             text = reply_message.text or reply_message.raw_text
             
             if not text:
@@ -103,6 +685,12 @@ class IPQueryModule(BaseModule):
             if not args:
                 await event.edit(self.get_command_usage("ip"), parse_mode='html')
                 return
+            
+            # 网段/地址范围
+            ip_range = self._parse_range(args[0]) if len(args) == 1 else None
+            if ip_range is not None:
+                await self._handle_range_query(event, *ip_range)
+                return
                 
             # 处理直接输入的目标
             targets = self._process_direct_input(args)
@@ -112,53 +700,527 @@ class IPQueryModule(BaseModule):
                 return
         
         # 限制最大处理数量
-        if len(targets) > 10:
-            targets = targets[:10]
-            # await event.edit("只处理前10个目标\n")
+        skipped = 0
+        if len(targets) > self.max_targets:
+            skipped = len(targets) - self.max_targets
+            targets = targets[:self.max_targets]
         
-        # 执行查询
-        results = []
-        for target in targets:
+        # 域名先解析为地址，再批量/并发执行查询，结果与输入顺序一致
+        expanded = await self._resolve_targets(targets)
+        lookups = list(dict.fromkeys(t for group in expanded for t in group))
+        if self.stream_results and len(targets) > 1:
+            data_list = await self._lookup_streaming(event, targets, expanded, lookups)
+        else:
+            notifier = self._make_wait_notifier(event)
             try:
-                response = requests.get(
-                    f"{self.api_endpoint}{target}",
-                    params={'lang': 'zh-CN'},
-                    timeout=self.timeout
-                )
-                data = response.json()
-                
-                if data.get('status') == 'success':
-                    results.append(self._format_single_result(data))
-                else:
-                    error_msg = data.get('message', '查询失败')
-                    results.append(f"❌ {target}: {error_msg}")
-                    
-            except requests.exceptions.Timeout:
-                results.append(f"⏳ {target}: 查询超时")
-            except Exception as e:
-                results.append(f"⚠️ {target}: 查询出错 - {str(e)}")
+                data_list = await self._lookup_many(lookups, notifier)
+            finally:
+                notifier.close()
+        data_map = dict(zip(lookups, data_list))
+        self._save_cache()
         
         # 使用blockquote包裹每个结果
-        formatted_results = "\n".join([f"<blockquote>{res}</blockquote>" for res in results])
-        await event.edit(formatted_results, parse_mode='html')
+        blocks = [
+            f"<blockquote>{self._render_target(target, group, data_map)}</blockquote>"
+            for target, group in zip(targets, expanded)
+        ]
+        if skipped:
+            blocks.append(f"ℹ️ 超出上限，已跳过 {skipped} 个目标")
+        await self._send_paged(event, blocks)
 
-    def _extract_targets(self, text: str) -> List[str]:
-        """从文本中提取所有IP和域名目标"""
-        targets = []
+    async def _resolve_targets(self, targets: List[str]) -> List[List[str]]:
+        """将每个目标展开为实际查询的地址列表：IP保持不变，域名并发解析，解析失败时保留域名交由ip-api处理"""
+        async def expand(target: str) -> List[str]:
+            if self.resolver is None or self._is_valid_ip(target):
+                return [target]
+            return await self.resolver.resolve(target) or [target]
+        return list(await asyncio.gather(*(expand(t) for t in targets)))
+
+    def _render_target(self, target: str, group: List[str], data_map: Dict[str, Dict]) -> str:
+        """渲染单个输入目标，域名解析出的每个地址各占一段"""
+        if group == [target]:
+            return self._render_result(target, data_map[target])
+        lines = [f"🔗 <b>{target}</b> → {len(group)} 个地址"]
+        lines.extend(self._render_result(addr, data_map[addr]) for addr in group)
+        return "\n".join(lines)
+
+    def _is_text_document(self, message) -> bool:
+        """判断回复的是否为可按行读取的文本文件"""
+        if not isinstance(message.media, MessageMediaDocument) or message.file is None:
+            return False
+        mime_type = (message.file.mime_type or '').lower()
+        if mime_type.startswith('text/') or mime_type in TEXT_MIME_TYPES:
+            return True
+        return os.path.splitext(message.file.name or '')[1].lower() in TEXT_FILE_EXTENSIONS
+
+    async def _handle_file_query(self, event: NewMessage.Event, reply_message, args: List[str]) -> None:
+        """文件批量查询：下载到临时目录后逐行提取目标，经有界队列分批查询，结果流式写入报告文件"""
+        fmt = 'json' if args and args[0].lower() == 'json' else 'csv'
+        file_name = os.path.basename(reply_message.file.name or "") or "targets.txt"
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                input_path = os.path.join(tmp_dir, "input")
+                report_path = os.path.join(tmp_dir, f"{os.path.splitext(file_name)[0]}_ip_report.{fmt}")
+                
+                await event.edit(f"⏬ 正在下载文件: <b>{html.escape(file_name)}</b>...", parse_mode='html')
+                await reply_message.download_media(file=input_path)
+                
+                lines, targets, truncated = await self._run_file_pipeline(event, input_path, report_path, fmt)
+                self._save_cache()
+                if not targets:
+                    await event.edit("❌ 文件中未找到IP地址或域名", parse_mode='html')
+                    return
+                
+                summary = f"📄 <b>{html.escape(file_name)}</b>: 共 {lines} 行，查询 {targets} 个目标"
+                if truncated:
+                    summary += f"\nℹ️ 已达到 {self.max_file_targets} 个目标上限，第 {lines} 行及之后的其余目标已跳过"
+                await event.reply(summary, file=report_path, parse_mode='html')
+                await event.edit(summary, parse_mode='html')
+        except Exception as e:
+            await event.edit(f"❌ 批量查询失败: {str(e)}", parse_mode='html')
+
+    async def _run_file_pipeline(self, event: NewMessage.Event, input_path: str,
+                                 report_path: str, fmt: str) -> Tuple[int, int, bool]:
+        """读取 -> 查询 -> 写报告的流水线，内存占用只与队列长度有关，返回 (已读行数, 目标数, 是否因达到上限而截断)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.file_workers * 2)
+        editor = _CoalescedEditor(event, self.stream_interval)
+        writer = _ReportWriter(report_path, fmt)
+        stats = {'lines': 0, 'targets': 0, 'done': 0, 'truncated': False}
+        notice = ""
+        
+        def refresh() -> None:
+            editor.update(
+                f"🔎 已读取 {stats['lines']} 行，已完成 {stats['done']}/{stats['targets']} 个目标{notice}"
+            )
+        
+        async def show_wait(remaining: int) -> None:
+            nonlocal notice
+            notice = f"\n⏳ 已达到ip-api速率限制，预计等待 {remaining} 秒…"
+            refresh()
+        
+        on_wait = _WaitTracker(show_wait)
+        
+        async def produce() -> None:
+            # 读文件与正则提取都在工作线程中按块进行，避免大文件阻塞事件循环
+            chunk = []
+            f = await asyncio.to_thread(open, input_path, 'r', encoding='utf-8', errors='replace')
+            try:
+                eof = False
+                while not eof and not stats['truncated']:
+                    remaining = self.max_file_targets - stats['targets']
+                    found, stats['lines'], eof = await asyncio.to_thread(
+                        self._read_file_targets, f, stats['lines'], remaining
+                    )
+                    if len(found) > remaining:
+                        found = found[:remaining]
+                        stats['truncated'] = True
+                    stats['targets'] += len(found)
+                    for item in found:
+                        chunk.append(item)
+                        if len(chunk) >= self.batch_size:
+                            await queue.put(chunk)
+                            chunk = []
+            finally:
+                f.close()
+            if chunk:
+                await queue.put(chunk)
+        
+        async def work() -> None:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                targets = [target for _, target in chunk]
+                expanded = await self._resolve_targets(targets)
+                lookups = list(dict.fromkeys(t for group in expanded for t in group))
+                data_map = dict(zip(lookups, await self._lookup_many(lookups, on_wait)))
+                for (line_no, target), group in zip(chunk, expanded):
+                    for lookup in group:
+                        data = data_map[lookup]
+                        writer.write({
+                            **data,
+                            'line': line_no,
+                            'target': target,
+                            'ip': lookup if self._is_valid_ip(lookup) else data.get('query', ''),
+                        })
+                stats['done'] += len(chunk)
+                refresh()
+        
+        async def feed() -> None:
+            await produce()
+            for _ in range(self.file_workers):
+                await queue.put(None)
+        
+        tasks = [asyncio.ensure_future(feed())]
+        tasks.extend(asyncio.ensure_future(work()) for _ in range(self.file_workers))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            on_wait.close()
+            writer.close()
+            await editor.close()
+        return stats['lines'], stats['targets'], stats['truncated']
+
+    def _read_file_targets(self, f, line_no: int, limit: int) -> Tuple[List[Tuple[int, str]], int, bool]:
+        """在工作线程中继续读取至多 file_read_lines 行并提取目标，目标数超过 limit 时提前停止；
+        返回 ([(行号, 目标)], 最后读取的行号, 是否已读到文件末尾)"""
+        found = []
+        for _ in range(self.file_read_lines):
+            line = f.readline()
+            if not line:
+                return found, line_no, True
+            line_no += 1
+            found.extend((line_no, target) for target in self._extract_targets(line))
+            if len(found) > limit:
+                break
+        return found, line_no, False
+
+    async def _lookup_streaming(self, event: NewMessage.Event, targets: List[str],
+                                expanded: List[List[str]], lookups: List[str]) -> List[Dict]:
+        """边查询边把已完成的目标编辑进消息（按原顺序，未完成的显示占位），编辑频率受限"""
+        editor = _CoalescedEditor(event, self.stream_interval)
+        blocks = [f"<blockquote>⏳ {target}: 查询中…</blockquote>" for target in targets]
+        pending = [len(group) for group in expanded]
+        owners: Dict[int, List[int]] = {}  # 查询下标 -> 依赖它的目标下标
+        position = {lookup: j for j, lookup in enumerate(lookups)}
+        for i, group in enumerate(expanded):
+            for lookup in group:
+                owners.setdefault(position[lookup], []).append(i)
+        data_map: Dict[str, Dict] = {}
+        done = 0
+        notice = ""
+        
+        def refresh() -> None:
+            footer = f"🔎 已完成 {done}/{len(targets)}{notice}"
+            editor.update(self._first_page(blocks, footer))
+        
+        def on_result(j: int, data: Dict) -> None:
+            nonlocal done
+            data_map[lookups[j]] = data
+            for i in owners[j]:
+                pending[i] -= 1
+                if pending[i] == 0:
+                    blocks[i] = f"<blockquote>{self._render_target(targets[i], expanded[i], data_map)}</blockquote>"
+                    done += 1
+            refresh()
+        
+        async def show_wait(remaining: int) -> None:
+            nonlocal notice
+            notice = f"\n⏳ 已达到ip-api速率限制，预计等待 {remaining} 秒…"
+            refresh()
+        
+        on_wait = _WaitTracker(show_wait)
         
-        # 提取IP地址 (IPv4 和 IPv6)
-        targets.extend(match.group() for match in self.ip_pattern.finditer(text))
+        try:
+            return await self._lookup_many(lookups, on_wait, on_result)
+        finally:
+            on_wait.close()
+            await editor.close()
+
+    def _first_page(self, blocks: List[str], footer: str) -> str:
+        """取能放进一条消息的前若干块并附上footer"""
+        text = ""
+        limit = MAX_MESSAGE_LENGTH - len(footer) - 1
+        for block in blocks:
+            if text and len(text) + len(block) + 1 > limit:
+                break
+            text = f"{text}\n{block}" if text else block
+        return f"{text}\n{footer}" if text else footer
+
+    def _make_wait_notifier(self, event: NewMessage.Event):
+        """生成限速等待回调：按整条命令的排队情况提示预计等待时间，并随排队进度刷新"""
+        async def show(remaining: int) -> None:
+            await event.edit(f"⏳ 已达到ip-api速率限制，预计等待 {remaining} 秒…", parse_mode='html')
+        
+        return _WaitTracker(show)
+
+    async def _send_paged(self, event: NewMessage.Event, blocks: List[str]) -> None:
+        """按消息长度上限分页发送，第一页编辑原消息，其余页追加新消息"""
+        pager = _PagedMessage(event)
+        for block in blocks:
+            await pager.add(block)
+        await pager.publish()
+
+    async def _handle_range_query(self, event: NewMessage.Event, first, last) -> None:
+        """网段查询：按块懒展开，相邻且归属相同的块合并显示，结果逐页输出"""
+        pager = _PagedMessage(event)
+        
+        async def show_wait(remaining: int) -> None:
+            await pager.publish(f"⏳ 已达到ip-api速率限制，预计等待 {remaining} 秒…")
+        
+        on_wait = _WaitTracker(show_wait)
+        
+        blocks = self._iter_range_blocks(first, last)
+        group = None  # [起始地址, 结束地址, 归属键, 代表结果]
+        looked_up = 0
+        truncated = False
+        while not truncated:
+            chunk = list(islice(blocks, min(self.batch_size, self.max_range_lookups - looked_up)))
+            if not chunk:
+                break
+            looked_up += len(chunk)
+            truncated = looked_up >= self.max_range_lookups and chunk[-1][1] < last
+            
+            try:
+                data_list = await self._lookup_many([self._range_representative(lo, hi) for lo, hi in chunk], on_wait)
+            finally:
+                on_wait.close()
+            for (lo, hi), data in zip(chunk, data_list):
+                key = self._network_key(data)
+                if group is not None and group[2] == key:
+                    group[1] = hi
+                    continue
+                if group is not None:
+                    await pager.add(self._render_range(*group))
+                group = [lo, hi, key, data]
+            await pager.publish(f"🔎 已查询 {looked_up} 个网段，进度 {chunk[-1][1]} / {last}")
+        
+        if group is not None:
+            await pager.add(self._render_range(*group))
+        if truncated:
+            await pager.add(f"ℹ️ 超出上限，仅查询了前 {looked_up} 个网段（至 {group[1]}）")
+        self._save_cache()
+        await pager.publish()
+
+    def _parse_range(self, text: str):
+        """解析 CIDR 网段或 起始-结束 地址范围，返回 (起始地址, 结束地址)，无效时返回None"""
+        text = text.strip()
+        if '/' in text:
+            try:
+                network = ipaddress.ip_network(text, strict=False)
+            except ValueError:
+                return None
+            return network.network_address, network.broadcast_address
+        if '-' in text:
+            start, _, end = text.partition('-')
+            try:
+                first, last = ipaddress.ip_address(start.strip()), ipaddress.ip_address(end.strip())
+            except ValueError:
+                return None
+            if first.version != last.version:
+                return None
+            return (first, last) if first <= last else (last, first)
+        return None
+
+    def _iter_range_blocks(self, first, last):
+        """按路由前缀对齐切分地址范围，逐块生成 (起始地址, 结束地址)，不展开单个地址"""
+        prefix = self.range_prefix[first.version]
+        block = ipaddress.ip_network(f"{first}/{prefix}", strict=False)
+        while True:
+            yield max(first, block.network_address), min(last, block.broadcast_address)
+            if block.broadcast_address >= last:
+                return
+            block = ipaddress.ip_network(f"{block.broadcast_address + 1}/{prefix}")
+
+    def _range_representative(self, lo, hi) -> str:
+        """块内用于查询的代表地址，避开网络地址本身"""
+        return str(lo + 1 if hi > lo else lo)
+
+    def _network_key(self, data: Dict) -> Tuple:
+        """判断相邻块能否合并的归属键"""
+        if data.get('status') == 'success':
+            return ('success', data.get('as'), data.get('country'), data.get('regionName'))
+        return (data.get('status'), data.get('message'))
+
+    def _render_range(self, lo, hi, key: Tuple, data: Dict) -> str:
+        """渲染一组合并后的地址块"""
+        networks = list(islice(ipaddress.summarize_address_range(lo, hi), 2))
+        label = str(networks[0]) if len(networks) == 1 else f"{lo} - {hi}"
+        if data.get('status') == 'success':
+            body = self._format_single_result({**data, 'query': label})
+            body += f"\n🔢 地址数: {int(hi) - int(lo) + 1}"
+        else:
+            body = self._render_result(label, data)
+        return f"<blockquote>{body}</blockquote>"
+
+    async def _lookup_many(self, targets: List[str], on_wait=None, on_result=None) -> List[Dict]:
+        """查询多个目标：离线库 -> 缓存 -> ip-api（IP走批量接口，域名逐个查询）
+        
+        on_result(index, data) 在每个目标得到结果时立即回调，用于流式显示
+        """
+        results: List[Optional[Dict]] = [None] * len(targets)
+        partial: Dict[int, Dict] = {}
+        
+        def finish(i: int, data: Dict) -> None:
+            # 离线库字段不全时，用远程结果补齐缺失字段
+            local = partial.get(i)
+            if local is not None:
+                data = {**data, **local} if data.get('status') == 'success' else local
+            results[i] = data
+            if on_result is not None:
+                on_result(i, data)
+        
+        use_local = self.local_backend is not None and self.local_backend.available
+        if use_local:
+            await self.local_backend.open()
+        missing = []
+        for i, target in enumerate(targets):
+            if use_local and self._is_valid_ip(target):
+                local = self.local_backend.lookup(target)
+                if local is not None:
+                    if self.local_backend.is_complete(local):
+                        finish(i, local)
+                        continue
+                    partial[i] = local
+            cached = self.cache.get(target.lower())
+            if cached is None:
+                missing.append(i)
+            else:
+                finish(i, cached)
+        
+        batch_idx = [i for i in missing if self._is_valid_ip(targets[i])]
+        if len(batch_idx) < 2:
+            batch_idx = []
+        batched = set(batch_idx)
+        single_idx = [i for i in missing if i not in batched]
+        
+        async def run_batch(chunk: List[int]) -> None:
+            chunk_data = await self._fetch_batch([targets[i] for i in chunk], on_wait)
+            for i, data in zip(chunk, chunk_data):
+                self._cache_result(targets[i], data)
+                finish(i, data)
+        
+        async def run_single(i: int) -> None:
+            data = await self._fetch(targets[i], on_wait)
+            self._cache_result(targets[i], data)
+            finish(i, data)
+        
+        chunks = [batch_idx[i:i + self.batch_size] for i in range(0, len(batch_idx), self.batch_size)]
+        await asyncio.gather(
+            *(run_batch(chunk) for chunk in chunks),
+            *(run_single(i) for i in single_idx)
+        )
+        return results
+
+    def _cache_result(self, target: str, data: Dict) -> None:
+        """按结果类型写入缓存"""
+        status = data.get('status')
+        if status == 'success':
+            self.cache.set(target.lower(), data, self.cache_ttl)
+            self._cache_dirty = True
+        elif status == 'fail':
+            self.cache.set(target.lower(), data, self.cache_fail_ttl)
+            self._cache_dirty = True
+
+    async def _fetch_batch(self, chunk: List[str], on_wait=None) -> List[Dict]:
+        """通过ip-api批量接口查询一组IP，返回与输入顺序一致的结果"""
+        try:
+            payload = await self._request(
+                'batch', 'POST', self.batch_endpoint, on_wait,
+                params={'lang': 'zh-CN'},
+                json=[{'query': t} for t in chunk]
+            )
+        except asyncio.TimeoutError:
+            return [{'status': 'timeout'} for _ in chunk]
+        except Exception as e:
+            return [{'status': 'error', 'message': str(e)} for _ in chunk]
+        
+        if not isinstance(payload, list):
+            message = payload.get('message', '批量查询失败') if isinstance(payload, dict) else '批量查询失败'
+            return [{'status': 'error', 'message': message} for _ in chunk]
+        
+        # 正常情况下按位置一一对应，数量不符时按query字段回填
+        if len(payload) == len(chunk):
+            return [item if isinstance(item, dict) else {'status': 'error', 'message': '无效结果'} for item in payload]
+        by_query = {item.get('query'): item for item in payload if isinstance(item, dict)}
+        return [by_query.get(t, {'status': 'error', 'message': '批量结果缺失'}) for t in chunk]
+
+    async def _fetch(self, target: str, on_wait=None) -> Dict:
+        """异步请求ip-api，超时/异常以 status=timeout/error 表示"""
+        try:
+            return await self._request(
+                'json', 'GET', f"{self.api_endpoint}{target}", on_wait,
+                params={'lang': 'zh-CN'}
+            )
+        except asyncio.TimeoutError:
+            return {'status': 'timeout'}
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    async def _request(self, kind: str, method: str, url: str, on_wait=None, **kwargs):
+        """经共享限速器排队后发出请求，被限流(429)时等待窗口重置并重试一次"""
+        session = self._get_session()
+        limiter = _RATE_LIMITERS[kind]
+        for attempt in range(2):
+            await limiter.acquire(on_wait)
+            async with self._semaphore:
+                async with session.request(method, url, **kwargs) as response:
+                    limiter.update(response.headers, response.status)
+                    if response.status != 429:
+                        return await response.json(content_type=None)
+        return {'status': 'error', 'message': '请求过于频繁，已被ip-api限流'}
+
+    def _render_result(self, target: str, data: Dict) -> str:
+        """将查询数据渲染为单条结果文本"""
+        status = data.get('status')
+        if status == 'success':
+            return self._format_single_result(data)
+        if status == 'timeout':
+            return f"⏳ {target}: 查询超时"
+        if status == 'error':
+            return f"⚠️ {target}: 查询出错 - {data.get('message', '')}"
+        return f"❌ {target}: {data.get('message', '查询失败')}"
+
+    def _extract_targets(self, text: str) -> List[str]:
+        """单次扫描文本提取所有IP和域名目标，按首次出现顺序去重"""
+        targets = {}
+        classified = {}  # 日志中同一片段会反复出现，只解析一次
+        for match in self.token_pattern.finditer(text):
+            token = match.group()
+            if token in classified:
+                continue
+            if '.' not in token and ':' not in token:
+                classified[token] = None
+                continue
+            target = classified[token] = self._classify_token(token)
+            if target is not None:
+                targets.setdefault(target, None)
+        return list(targets)
+
+    def _classify_token(self, token: str) -> Optional[str]:
+        """将候选片段规范化为IP或域名，无效时返回None"""
+        # 去掉URL协议与路径，只保留主机部分
+        if '/' in token:
+            parts = token.split('/')
+            if parts[0].endswith(':') and len(parts) > 2 and not parts[1]:
+                token = parts[2]
+            else:
+                token = parts[0]
         
-        # 提取域名
-        targets.extend(match.group() for match in self.domain_pattern.finditer(text))
+        core = token.strip('.-_')
+        if core.startswith('['):
+            # [IPv6]:port
+            end = core.find(']')
+            return self._normalize_ip(core[1:end]) if end > 0 else None
+        core = core.strip('[]')
         
-        # 去重
-        unique_targets = []
-        for target in targets:
-            if target not in unique_targets:
-                unique_targets.append(target)
+        if ':' in core:
+            ip = self._normalize_ip(core) or self._normalize_ip(core.strip(':'))
+            if ip is not None:
+                return ip
+            host, _, port = core.strip(':').rpartition(':')
+            if not port.isdigit() or ':' in host:
+                # key:value（如 client:10.0.0.5、Host:example.com:443），先取值再取键
+                key, _, value = core.strip(':').partition(':')
+                return self._classify_token(value) or self._classify_token(key)
+            # host:port
+            core = host
         
-        return unique_targets
+        if not core:
+            return None
+        if core.replace('.', '').isdigit():
+            return self._normalize_ip(core)
+        return core.lower() if self._is_valid_domain(core) else None
+
+    def _normalize_ip(self, text: str) -> Optional[str]:
+        """解析IP地址并返回标准形式"""
+        try:
+            return str(ipaddress.ip_address(text))
+        except ValueError:
+            return None
 
     def _process_direct_input(self, args: List[str]) -> List[str]:
         """处理直接输入的目标"""
@@ -181,7 +1243,7 @@ class IPQueryModule(BaseModule):
         if cleaned.startswith(('http://', 'https://')):
             try:
                 parsed = urlparse(cleaned)
-                cleaned = parsed.netloc.split(':')[0]  # 移除端口号
+                cleaned = parsed.hostname or cleaned  # 移除端口号及IPv6方括号
             except:
                 pass
         
@@ -189,11 +1251,14 @@ class IPQueryModule(BaseModule):
 
     def _is_valid_ip(self, ip: str) -> bool:
         """验证IP地址格式"""
-        return bool(self.ip_pattern.fullmatch(ip))
+        return self._normalize_ip(ip) is not None
 
     def _is_valid_domain(self, domain: str) -> bool:
-        """验证域名格式"""
-        return bool(self.domain_pattern.fullmatch(domain))
+        """验证域名格式（至少两级，顶级域不能是纯数字或常见文件扩展名）"""
+        labels = domain.split('.')
+        if len(labels) < 2 or len(domain) > 253 or labels[-1].isdigit() or labels[-1].lower() in FILE_EXTENSIONS:
+            return False
+        return all(self.label_pattern.fullmatch(label) for label in labels)
 
     def _format_single_result(self, data: Dict) -> str:
         """格式化单个查询结果"""
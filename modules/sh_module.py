@@ -1,18 +1,258 @@
+import os
+import re
+import time
+import uuid
+import shlex
+import shutil
+import signal
+import codecs
 import asyncio
+import hashlib
+import tempfile
 import subprocess
-from typing import List, Dict
+from typing import List, Dict, Tuple, Optional
 from telethon.events import NewMessage
+from telethon.errors import FloodWaitError, MessageNotModifiedError
 from modules.base_module import BaseModule
 
+try:
+    import resource  # 仅POSIX可用
+except ImportError:
+    resource = None
+
+READ_MIN_SIZE = 4096  # 单次读取的最小/最大字节数，按输出速度自适应
+READ_MAX_SIZE = 256 * 1024
+STREAM_LIMIT = 1024 * 1024  # 子进程管道读缓冲区大小
+OUTPUT_VIEW_LENGTH = 2000  # 消息中显示的输出长度
+MAX_SPILL_SIZE = 100 * 1024 * 1024  # 完整输出临时文件的大小上限（字符）
+
+class _Job:
+    """一条排队中或运行中的Shell命令"""
+
+    def __init__(self, job_id: int, command: str, timeout: float):
+        self.id = job_id
+        self.command = command
+        self.timeout = timeout  # 墙上时钟超时（秒），0 表示不限制
+        self.created = time.monotonic()
+        self.started = None
+        self.process = None
+        self.task = None
+
+    @property
+    def running(self) -> bool:
+        return self.started is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - (self.started or self.created)
+
+class _ShellSession:
+    """常驻shell会话：命令通过哨兵标记分帧，cwd与环境变量在命令之间保留"""
+
+    def __init__(self, shell: str):
+        self.shell = shell
+        self.process = None
+        self.lock = asyncio.Lock()  # 同一会话内命令依次执行
+        self.busy = False
+        self.returncode = None
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, preexec_fn=None) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            self.shell,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            limit=STREAM_LIMIT,
+            start_new_session=True,
+            preexec_fn=preexec_fn
+        )
+
+    async def run(self, command: str, channel: asyncio.Queue) -> None:
+        """执行一条命令，输出放入 channel，结束时记录退出码并放入 None"""
+        marker = f"__AIDE_DONE_{uuid.uuid4().hex}__"
+        done = re.compile(rf"\n{marker} (-?\d+)\n")
+        self.busy = True
+        self.last_used = time.monotonic()
+        # eval 避免语法错误打断会话，stdin 重定向避免命令读走后续的分帧指令
+        script = f"{{ eval {shlex.quote(command)}\n}} < /dev/null\nprintf '\\n%s %d\\n' {marker} \"$?\"\n"
+        self.process.stdin.write(script.encode('utf-8'))
+        await self.process.stdin.drain()
+        
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        pending = ""
+        while True:
+            data = await self.process.stdout.read(READ_MAX_SIZE)
+            if not data:
+                # shell 自身退出（如执行了 exit）
+                text = pending + decoder.decode(b'', final=True)
+                if text:
+                    await channel.put(text)
+                self.returncode = await self.process.wait()
+                break
+            text = pending + decoder.decode(data)
+            match = done.search(text)
+            if match:
+                if match.start():
+                    await channel.put(text[:match.start()])
+                self.returncode = int(match.group(1))
+                self.busy = False
+                break
+            text, pending = self._hold_back(text, marker)
+            if text:
+                await channel.put(text)
+        self.last_used = time.monotonic()
+        await channel.put(None)
+
+    @staticmethod
+    def _hold_back(text: str, marker: str) -> Tuple[str, str]:
+        """结尾可能是哨兵行的开头时暂缓输出这一部分，返回 (可输出部分, 暂缓部分)"""
+        pos = text.rfind('\n')
+        if pos < 0:
+            return text, ""
+        rest = text[pos + 1:]
+        head = marker + ' '
+        if head.startswith(rest) or rest.startswith(head):
+            return text[:pos], text[pos:]
+        return text, ""
+
+class _EditScheduler:
+    """消息编辑调度：跳过内容未变的编辑，FloodWait时指数退避，持续刷屏时逐渐放慢编辑频率"""
+
+    def __init__(self, event: NewMessage.Event, min_interval: float = 1.0,
+                 max_interval: float = 5.0, max_backoff: float = 300.0):
+        self.event = event
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.interval = min_interval
+        self.edits = 0
+        self.skipped = 0
+        self._backoff = 0.0
+        self._last_digest = None
+        self._last_output = 0.0
+        self._next_at = time.monotonic() + min_interval
+
+    def wait_time(self) -> float:
+        """距离下一次允许编辑的秒数，已到期时返回当前间隔作为空闲等待时长"""
+        remaining = self._next_at - time.monotonic()
+        return remaining if remaining > 0 else self.interval
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self._next_at
+
+    def output_arrived(self) -> None:
+        """有新输出时调用：安静一段时间后的零星输出恢复最快的编辑频率"""
+        now = time.monotonic()
+        if now - self._last_output > self.interval:
+            self.interval = self.min_interval
+        self._last_output = now
+
+    async def update(self, text: str, final: bool = False) -> bool:
+        """尝试编辑消息，返回是否实际发出了编辑；final 为 True 时忽略间隔并在FloodWait后重试"""
+        if not final and not self.ready():
+            return False
+        digest = hashlib.md5(text.encode('utf-8')).digest()
+        if digest == self._last_digest:
+            self.skipped += 1
+            return False
+        while True:
+            try:
+                await self.event.edit(text, parse_mode='html')
+                break
+            except MessageNotModifiedError:
+                break
+            except FloodWaitError as e:
+                self._backoff = min(max(self._backoff * 2, e.seconds, self.min_interval), self.max_backoff)
+                self._next_at = time.monotonic() + self._backoff
+                if not final:
+                    return False
+                await asyncio.sleep(e.seconds)
+        self._backoff = 0.0
+        self._last_digest = digest
+        self.edits += 1
+        # 连续编辑说明输出持续变化，逐步拉长间隔
+        self.interval = min(self.max_interval, self.interval * 1.5)
+        self._next_at = time.monotonic() + self.interval
+        return True
+
+class _OutputBuffer:
+    """有界输出缓冲：内存中只保留开头和结尾各一段，完整输出写入临时文件"""
+
+    def __init__(self, keep: int = OUTPUT_VIEW_LENGTH, max_spill: int = MAX_SPILL_SIZE):
+        self.keep = keep
+        self.max_spill = max_spill
+        self.head = ""
+        self.tail = ""
+        self.total = 0
+        self.spilled = 0
+        self._file = tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', prefix='sh_output_', suffix='.txt', delete=False
+        )
+        self.path = self._file.name
+
+    def write(self, text: str) -> None:
+        self.total += len(text)
+        if self.spilled < self.max_spill:
+            part = text[:self.max_spill - self.spilled]
+            self._file.write(part)
+            self.spilled += len(part)
+        if len(self.head) < self.keep:
+            take = self.keep - len(self.head)
+            self.head += text[:take]
+            text = text[take:]
+        if text:
+            self.tail = (self.tail + text[-self.keep:])[-self.keep:]
+
+    @property
+    def truncated(self) -> bool:
+        """显示内容是否不完整"""
+        return self.total > self.keep
+
+    def snapshot(self) -> str:
+        """返回开头与结尾拼接的文本；未超出缓冲时即为完整输出"""
+        return self.head + self.tail
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
 class ShellModule(BaseModule):
     def __init__(self):
         super().__init__()
         self.name = "Shell执行器"
         self.description = "执行Shell命令并实时显示输出"
-        self.version = "1.0.0"
+        self.version = "1.5.3"
         self.author = "lanyi233"
         self.client = None
-        self.active_processes = {}
+        self.jobs: Dict[int, _Job] = {}
+        self._next_job_id = 1
+        self._slots = None
+        
+        self.max_jobs = 4  # 同时运行的最大命令数，超出的排队等待
+        self.timeout = 1800  # 默认超时（秒），可用 -t 覆盖，0 表示不限制
+        self.kill_grace = 3  # 终止时 SIGTERM 到 SIGKILL 的宽限时间（秒）
+        # 子进程资源上限，None 表示不限制
+        self.rlimit_cpu = None  # CPU时间（秒）
+        self.rlimit_as = None  # 虚拟内存（字节）
+        
+        # 会话模式：开启后同一聊天的命令在同一个常驻shell中执行
+        self.session_shell = shutil.which('bash') or '/bin/sh'
+        self.session_idle_timeout = 600  # 会话空闲多久后关闭（秒）
+        self.session_chats = set()
+        self.sessions: Dict[int, _ShellSession] = {}
+        self._session_pending: Dict[int, asyncio.Future] = {}  # 正在启动的会话，同一聊天的并发命令共用
+        self._reaper = None
 
     def get_commands(self) -> Dict[str, str]:
         return {
@@ -32,7 +272,11 @@ class ShellModule(BaseModule):
             "sh": (
                 "<blockquote>执行Shell命令</blockquote>\n\n"
                 "<b>用法</b>\n"
-                "• <code>,sh 命令</code> 执行Shell命令"
+                "• <code>,sh 命令</code> 执行Shell命令\n"
+                "• <code>,sh -t 秒数 命令</code> 指定超时（0 为不限制）\n"
+                "• <code>,sh jobs</code> 查看排队/运行中的命令\n"
+                "• <code>,sh kill 编号</code> 终止命令\n"
+                "• <code>,sh session on/off</code> 开启/关闭会话模式（保留目录与环境变量）"
             )
         }
         return usage_map.get(command, "")
@@ -41,21 +285,138 @@ class ShellModule(BaseModule):
         self.client = client
 
     async def module_unloaded(self) -> None:
-        # 取消所有正在运行的进程
-        for task in self.active_processes.values():
-            task.cancel()
+        # 结束所有子进程并取消任务
+        for job in list(self.jobs.values()):
+            if job.process is not None:
+                self._signal_group(job.process, signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+            if job.task is not None:
+                job.task.cancel()
+        for pending in list(self._session_pending.values()):
+            pending.cancel()
+        for chat_id in list(self.sessions):
+            self._close_session(chat_id)
+        if self._reaper is not None:
+            self._reaper.cancel()
         self.client = None
 
     async def handle_command(self, command: str, event: NewMessage.Event, args: List[str]) -> None:
         if command == "sh":
+            if len(args) == 1 and args[0] == "jobs":
+                await self._list_jobs(event)
+                return
+            # 编号不是当前任务时按普通 kill 命令执行
+            if len(args) == 2 and args[0] == "kill" and args[1].isdigit() and int(args[1]) in self.jobs:
+                await self._kill_job(event, int(args[1]))
+                return
+            if args and args[0] == "session" and (len(args) == 1 or (len(args) == 2 and args[1] in ("on", "off"))):
+                await self._handle_session_command(event, args[1:])
+                return
             await self._handle_shell(event, args)
 
+    async def _handle_session_command(self, event: NewMessage.Event, args: List[str]) -> None:
+        """开启/关闭当前聊天的会话模式"""
+        chat_id = event.chat_id
+        if args and args[0] == "on":
+            self.session_chats.add(chat_id)
+            await event.edit(
+                f"🐚 已开启会话模式，空闲 {self.session_idle_timeout}s 后自动关闭会话",
+                parse_mode='html'
+            )
+        elif args and args[0] == "off":
+            self.session_chats.discard(chat_id)
+            self._close_session(chat_id)
+            await event.edit("🐚 已关闭会话模式", parse_mode='html')
+        else:
+            session = self.sessions.get(chat_id)
+            if chat_id not in self.session_chats:
+                state = "未开启"
+            elif session is not None and session.alive:
+                state = f"运行中 PID {session.process.pid}，空闲 {time.monotonic() - session.last_used:.0f}s"
+            else:
+                state = "已开启，下一条命令时启动"
+            await event.edit(f"🐚 会话模式: {state}", parse_mode='html')
+
+    async def _get_session(self, chat_id: int) -> _ShellSession:
+        """获取聊天对应的会话，不存在或已退出时重新启动；并发的首批命令共用同一次启动"""
+        session = self.sessions.get(chat_id)
+        if session is not None and session.alive:
+            return session
+        pending = self._session_pending.get(chat_id)
+        if pending is None:
+            pending = self._session_pending[chat_id] = asyncio.ensure_future(self._start_session(chat_id))
+            pending.add_done_callback(lambda _: self._session_pending.pop(chat_id, None))
+        return await asyncio.shield(pending)
+
+    async def _start_session(self, chat_id: int) -> _ShellSession:
+        session = _ShellSession(self.session_shell)
+        try:
+            await session.start(self._child_preexec())
+        except asyncio.CancelledError:
+            if session.alive:
+                self._terminate(session.process)
+            raise
+        self.sessions[chat_id] = session
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_sessions())
+        return session
+
+    async def _acquire_session(self, chat_id: int) -> _ShellSession:
+        """取得会话并持有其锁；等锁期间会话被关闭或作废时释放锁，改用新会话"""
+        while True:
+            session = await self._get_session(chat_id)
+            await session.lock.acquire()
+            if self.sessions.get(chat_id) is session and session.alive:
+                return session
+            session.lock.release()
+
+    def _close_session(self, chat_id: int) -> None:
+        session = self.sessions.pop(chat_id, None)
+        if session is not None and session.alive:
+            self._terminate(session.process)
+
+    async def _reap_sessions(self) -> None:
+        """定期关闭空闲超时或已退出的会话"""
+        while self.sessions:
+            await asyncio.sleep(min(60, self.session_idle_timeout))
+            now = time.monotonic()
+            for chat_id, session in list(self.sessions.items()):
+                idle = not session.lock.locked() and now - session.last_used > self.session_idle_timeout
+                if idle or not session.alive:
+                    self._close_session(chat_id)
+
+    async def _list_jobs(self, event: NewMessage.Event) -> None:
+        """列出排队中和运行中的命令"""
+        if not self.jobs:
+            await event.edit("📭 当前没有运行中的命令", parse_mode='html')
+            return
+        lines = ["<blockquote>Shell任务</blockquote>\n"]
+        for job in self.jobs.values():
+            if job.running:
+                pid = job.process.pid if job.process is not None else "-"
+                state = f"▶️ 运行中 {job.elapsed():.0f}s PID {pid}"
+            else:
+                state = f"⌛ 排队中 {job.elapsed():.0f}s"
+            lines.append(f"<b>#{job.id}</b> {state}\n<code>{job.command}</code>")
+        await event.edit("\n".join(lines), parse_mode='html')
+
+    async def _kill_job(self, event: NewMessage.Event, job_id: int) -> None:
+        """取消任务，运行中的命令会连同整个进程组一起终止"""
+        job = self.jobs[job_id]
+        job.task.cancel()
+        await event.edit(f"🛑 已终止 #{job_id} [<code>{job.command}</code>]", parse_mode='html')
+
     async def _handle_shell(self, event: NewMessage.Event, args: List[str]) -> None:
         # 安全校验
         if not args:
             await event.edit(self.get_command_usage("sh"), parse_mode='html')
             return
             
+        # 超时参数
+        timeout = self.timeout
+        if len(args) > 2 and args[0] == "-t" and args[1].isdigit():
+            timeout = int(args[1])
+            args = args[2:]
+        
         command = " ".join(args)
         
         # 安全过滤 - 禁止危险命令
@@ -64,83 +425,202 @@ class ShellModule(BaseModule):
             await event.edit("❌ 拒绝执行危险命令", parse_mode='html')
             return
         
-        # 创建初始消息
-        progress_msg = await event.edit(
-            f"✨运行中... [<code>{command}</code>]\n<blockquote>等待输出...</blockquote>",
-            parse_mode='html'
-        )
-        
-        # 创建任务ID
-        task_id = f"{event.chat_id}_{event.id}"
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_jobs)
         
-        # 启动任务
-        task = asyncio.create_task(self._execute_shell(event, command, task_id))
-        self.active_processes[task_id] = task
+        # 登记与启动之间不能有 await，保证 kill 时任务已存在
+        job = _Job(self._next_job_id, command, timeout)
+        self._next_job_id += 1
+        job.task = asyncio.create_task(self._run_job(event, job))
+        self.jobs[job.id] = job
         
         try:
-            await task
+            await job.task
         except asyncio.CancelledError:
             await event.edit(f"⛔ 命令已取消 [<code>{command}</code>]", parse_mode='html')
         finally:
-            self.active_processes.pop(task_id, None)
+            self.jobs.pop(job.id, None)
 
-    async def _execute_shell(self, event: NewMessage.Event, command: str, task_id: str) -> None:
-        """执行Shell命令并实时更新消息"""
-        try:
-            # 创建子进程
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                limit=1024  # 输出缓冲区大小
+    async def _run_job(self, event: NewMessage.Event, job: _Job) -> None:
+        """等待空闲名额后执行；会话模式下先取得会话锁再占用名额，排队等会话的命令不占名额"""
+        use_session = event.chat_id in self.session_chats
+        current = self.sessions.get(event.chat_id) if use_session else None
+        
+        # 创建初始消息
+        if self._slots.locked() or (current is not None and current.lock.locked()):
+            await event.edit(f"⌛ 排队中 #{job.id} [<code>{job.command}</code>]", parse_mode='html')
+        else:
+            await event.edit(
+                f"✨运行中... [<code>{job.command}</code>]\n<blockquote>等待输出...</blockquote>",
+                parse_mode='html'
             )
+        
+        session = await self._acquire_session(event.chat_id) if use_session else None
+        try:
+            async with self._slots:
+                job.started = time.monotonic()
+                await self._execute_shell(event, job.command, job, session)
+        finally:
+            if session is not None:
+                session.lock.release()
+
+    def _child_preexec(self):
+        """需要限制子进程资源时返回 preexec_fn"""
+        if resource is not None and (self.rlimit_cpu or self.rlimit_as):
+            return self._limit_child
+        return None
+
+    def _limit_child(self) -> None:
+        """在子进程中设置资源上限（fork 后、exec 前执行）"""
+        if self.rlimit_cpu:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.rlimit_cpu, self.rlimit_cpu))
+        if self.rlimit_as:
+            resource.setrlimit(resource.RLIMIT_AS, (self.rlimit_as, self.rlimit_as))
+
+    def _signal_group(self, process, sig) -> None:
+        """向子进程所在的进程组发送信号"""
+        if process.returncode is not None:
+            return
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, sig)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _terminate(self, process) -> None:
+        """先 SIGTERM 整个进程组，宽限期后仍未退出则 SIGKILL"""
+        self._signal_group(process, signal.SIGTERM)
+        if hasattr(signal, 'SIGKILL'):
+            asyncio.get_event_loop().call_later(self.kill_grace, self._signal_group, process, signal.SIGKILL)
+
+    async def _execute_shell(self, event: NewMessage.Event, command: str, job: _Job,
+                             session: Optional[_ShellSession] = None) -> None:
+        """执行Shell命令并实时更新消息；传入 session 时在该会话中执行（调用方已持有会话锁）"""
+        output = None
+        process = None
+        try:
+            deadline = time.monotonic() + job.timeout if job.timeout else None
+            channel = asyncio.Queue(maxsize=64)
+            
+            if session is not None:
+                # 会话模式：在常驻shell中执行，输出已合并为一个流
+                process = session.process
+                pumps = [asyncio.create_task(session.run(command, channel))]
+            else:
+                # 创建子进程（独立进程组，便于整组终止）
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    limit=STREAM_LIMIT,
+                    start_new_session=True,
+                    preexec_fn=self._child_preexec()
+                )
+                # stdout/stderr 各自独立读取，按到达顺序汇入同一个队列
+                pumps = [
+                    asyncio.create_task(self._pump_stream(process.stdout, channel)),
+                    asyncio.create_task(self._pump_stream(process.stderr, channel))
+                ]
+            job.process = process
             
-            output = ""
-            last_update = asyncio.get_event_loop().time()
+            output = _OutputBuffer()
+            scheduler = _EditScheduler(event)
+            open_streams = len(pumps)
             
             # 实时读取输出
-            while True:
-                # 读取stdout和stderr
-                stdout = await process.stdout.read(256)
-                stderr = await process.stderr.read(256)
-                
-                # 处理输出
-                if stdout:
-                    output += stdout.decode('utf-8', 'ignore')
-                if stderr:
-                    output += stderr.decode('utf-8', 'ignore')
-                
-                # 定期更新消息 (每秒最多更新一次)
-                current_time = asyncio.get_event_loop().time()
-                if output and (current_time - last_update > 1.0):
-                    truncated = self._truncate_output(output)
-                    await event.edit(
-                        f"✨运行中... [<code>{command}</code>]\n<blockquote>{truncated}</blockquote>",
-                        parse_mode='html'
-                    )
-                    last_update = current_time
-                
-                # 检查进程是否结束
-                if process.stdout.at_eof() and process.stderr.at_eof():
-                    await process.wait()
-                    break
+            try:
+                while open_streams:
+                    wait = scheduler.wait_time()
+                    if deadline is not None:
+                        if time.monotonic() >= deadline:
+                            raise asyncio.TimeoutError()
+                        wait = min(wait, deadline - time.monotonic())
+                    try:
+                        chunk = await asyncio.wait_for(channel.get(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        chunk = ""
+                    if chunk is None:
+                        open_streams -= 1
+                        continue
+                    if chunk:
+                        output.write(chunk)
+                        scheduler.output_arrived()
+                    
+                    # 按调度更新消息，内容不变时不编辑
+                    if output.total and scheduler.ready():
+                        truncated = self._truncate_output(output.snapshot())
+                        await scheduler.update(
+                            f"✨运行中... [<code>{command}</code>]\n<blockquote>{truncated}</blockquote>"
+                        )
+            finally:
+                for pump in pumps:
+                    pump.cancel()
+                output.close()
+            
+            if session is not None:
+                exit_code = session.returncode
+            elif deadline is None:
+                exit_code = await process.wait()
+            else:
+                exit_code = await asyncio.wait_for(process.wait(), timeout=max(deadline - time.monotonic(), 0.1))
                     
             # 最终输出
-            exit_code = process.returncode
-            truncated = self._truncate_output(output)
+            truncated = self._truncate_output(output.snapshot())
             status = "✅" if exit_code == 0 else "⚠️"
             
-            await event.edit(
+            await scheduler.update(
                 f"{status}运行完成 [<code>{command}</code>] (Code: {exit_code})\n<blockquote>{truncated}</blockquote>",
-                parse_mode='html'
+                final=True
             )
             
+            # 输出被截断时上传完整输出
+            if output.truncated:
+                caption = f"📄 完整输出 ({output.total} 字符)"
+                if output.spilled < output.total:
+                    caption += f"，仅保存了前 {output.spilled} 字符"
+                await event.reply(caption, file=output.path)
+            
         except asyncio.TimeoutError:
-            await event.edit(f"⏱️ 命令超时 [<code>{command}</code>]", parse_mode='html')
+            await event.edit(f"⏱️ 命令超时 ({job.timeout}s) [<code>{command}</code>]", parse_mode='html')
         except Exception as e:
             await event.edit(f"❌ 执行错误: {str(e)} [<code>{command}</code>]", parse_mode='html')
+        finally:
+            # 超时、取消或出错时不留下子进程；会话中命令未正常结束时整个会话作废
+            if session is not None:
+                if session.busy:
+                    if self.sessions.get(event.chat_id) is session:
+                        del self.sessions[event.chat_id]
+                    if session.alive:
+                        self._terminate(session.process)
+            elif process is not None and process.returncode is None:
+                self._terminate(process)
+            if output is not None:
+                output.discard()
+
+    async def _pump_stream(self, stream: asyncio.StreamReader, channel: asyncio.Queue) -> None:
+        """持续读取单个输出流并增量解码，结束时放入 None"""
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')  # 多字节字符跨块时不会被截断
+        size = READ_MIN_SIZE
+        while True:
+            data = await stream.read(size)
+            if not data:
+                break
+            # 读满说明输出很快，加大读取块；明显读不满时回落
+            if len(data) == size:
+                size = min(size * 2, READ_MAX_SIZE)
+            elif len(data) < size // 4:
+                size = max(size // 2, READ_MIN_SIZE)
+            text = decoder.decode(data)
+            if text:
+                await channel.put(text)
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            await channel.put(tail)
+        await channel.put(None)
 
-    def _truncate_output(self, output: str, max_length: int = 2000) -> str:
+    def _truncate_output(self, output: str, max_length: int = OUTPUT_VIEW_LENGTH) -> str:
        """改进的截断输出函数"""
        if len(output) <= max_length:
            return output
@@ -0,0 +1,125 @@
+"""对比 ip 模块目标提取的旧正则实现与单次扫描实现
+
+需要在 Tgaide 运行环境中执行（依赖 telethon 与 modules.base_module）:
+
+    cd ${tgaide_dir}
+    python /path/to/aidepack2/scripts/bench_ip_extract.py --size-mb 4
+"""
+import argparse
+import importlib.util
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+MODULE_FILE = Path(__file__).parent.parent / "modules" / "ip_module.py"
+
+# 3.4.0 及之前版本使用的提取正则
+LEGACY_IP_PATTERN = re.compile(
+    r'(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
+    r'|'
+    r'(?:(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'
+    r'|'
+    r'(?:[0-9a-fA-F]{1,4}:){1,7}:'
+    r'|'
+    r'(?:[0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}'
+    r'|'
+    r':(?:[0-9a-fA-F]{1,4}:){0,6}[0-9a-fA-F]{1,4}'
+    r'|'
+    r'[0-9a-fA-F]{1,4}::[0-9a-fA-F]{1,4})'
+)
+LEGACY_DOMAIN_PATTERN = re.compile(
+    r'\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9][a-z0-9-]{0,61}[a-z0-9]\b',
+    re.IGNORECASE
+)
+
+
+def legacy_extract(text):
+    targets = []
+    targets.extend(match.group() for match in LEGACY_IP_PATTERN.finditer(text))
+    targets.extend(match.group() for match in LEGACY_DOMAIN_PATTERN.finditer(text))
+    unique_targets = []
+    for target in targets:
+        if target not in unique_targets:
+            unique_targets.append(target)
+    return unique_targets
+
+
+def build_log(size_bytes, unique, seed=0):
+    """生成类似防火墙/nginx日志的文本"""
+    rng = random.Random(seed)
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(unique)]
+    hosts = [f"node{i}.example{i % 97}.com" for i in range(unique // 4)]
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = (
+            f"2025-08-17T02:54:02Z DROP IN=eth0 SRC={rng.choice(ips)} DST={rng.choice(ips)} "
+            f"LEN=60 TTL=51 PROTO=TCP SPT={rng.randint(1024, 65535)} DPT=443 "
+            f"host={rng.choice(hosts)} uri=/api/v1/items/{rng.randint(1, 99999)}.json\n"
+        )
+        lines.append(line)
+        total += len(line)
+    return "".join(lines)
+
+
+def load_module():
+    spec = importlib.util.spec_from_file_location("ip_module", MODULE_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.IPQueryModule()
+
+
+# (输入, 期望结果)：提取结果必须与之完全一致
+EXTRACT_CASES = [
+    ("client:10.0.0.5 Host:example.com", ['10.0.0.5', 'example.com']),
+    ("upstream:10.0.0.6:8080 peer=[2001:db8::1]:443", ['10.0.0.6', '2001:db8::1']),
+    ("https://api.example.org/v1/x.json 192.0.2.1:22", ['api.example.org', '192.0.2.1']),
+    ("report.txt img.png 12:34:56", []),
+]
+
+
+def check_cases(module):
+    for text, expected in EXTRACT_CASES:
+        result = module._extract_targets(text)
+        assert result == expected, f"{text!r}: {result} != {expected}"
+    print(f"用例检查: {len(EXTRACT_CASES)} 条通过")
+
+
+def timed(func, text, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=2.0)
+    parser.add_argument("--unique", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ".")
+    module = load_module()
+    check_cases(module)
+    text = build_log(int(args.size_mb * 1024 * 1024), args.unique)
+    print(f"输入: {len(text) / 1024 / 1024:.1f} MB, {text.count(chr(10))} 行")
+
+    new_time, new_targets = timed(module._extract_targets, text, args.repeat)
+    print(f"单次扫描: {new_time * 1000:8.1f} ms, {len(new_targets)} 个目标")
+
+    if not args.skip_legacy:
+        old_time, old_targets = timed(legacy_extract, text, 1)
+        print(f"旧正则:   {old_time * 1000:8.1f} ms, {len(old_targets)} 个目标")
+        print(f"加速比:   {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
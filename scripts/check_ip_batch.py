@@ -0,0 +1,108 @@
+"""用本地桩会话检查 ip 模块批量查询的结果回填顺序
+
+需要在 Tgaide 运行环境中执行（依赖 telethon、aiohttp 与 modules.base_module），不会访问网络:
+
+    cd ${tgaide_dir}
+    python /path/to/aidepack2/scripts/check_ip_batch.py
+"""
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+
+MODULE_FILE = Path(__file__).parent.parent / "modules" / "ip_module.py"
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.status = 200
+        self.headers = {'X-Rl': '14', 'X-Ttl': '60'}
+        self._payload = payload
+
+    async def json(self, content_type=None):
+        if isinstance(self._payload, Exception):
+            raise self._payload
+        return self._payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class StubSession:
+    """按请求体里的 query 列表生成响应，respond(queries) 返回 payload"""
+
+    closed = False
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        queries = [item['query'] for item in kwargs.get('json') or []]
+        self.requests.append(queries)
+        return StubResponse(self.respond(queries))
+
+
+def answer(query):
+    return {'status': 'success', 'query': query, 'country': f"C-{query}"}
+
+
+def load_module():
+    spec = importlib.util.spec_from_file_location("ip_module", MODULE_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.IPQueryModule()
+
+
+def use_stub(module, respond):
+    module.session = StubSession(respond)
+    module._semaphore = asyncio.Semaphore(module.max_concurrency)
+    module.cache.clear()
+    module.cache_file = None
+    module.local_backend = None
+    return module.session
+
+
+async def run_checks():
+    module = load_module()
+    chunk = ['192.0.2.1', '192.0.2.2', '192.0.2.3']
+
+    # 数量一致：按位置对应
+    use_stub(module, lambda queries: [answer(q) for q in queries])
+    results = await module._fetch_batch(chunk)
+    assert [r['query'] for r in results] == chunk, results
+
+    # 数量不一致且乱序：按 query 字段回填，缺失的标记为错误
+    use_stub(module, lambda queries: [answer(q) for q in reversed(queries[:2])])
+    results = await module._fetch_batch(chunk)
+    assert [r.get('query') for r in results] == chunk[:2] + [None], results
+    assert results[2] == {'status': 'error', 'message': '批量结果缺失'}, results
+
+    # 非列表响应与请求异常：整批标记为错误
+    use_stub(module, lambda queries: {'message': 'invalid query'})
+    results = await module._fetch_batch(chunk)
+    assert all(r == {'status': 'error', 'message': 'invalid query'} for r in results), results
+    use_stub(module, lambda queries: ValueError("bad json"))
+    results = await module._fetch_batch(chunk)
+    assert all(r['status'] == 'error' for r in results), results
+
+    # 端到端：分块并发、每块乱序返回，结果仍与输入顺序一致
+    module.batch_size = 2
+    targets = [f"198.51.100.{i}" for i in range(1, 8)]
+    session = use_stub(module, lambda queries: [answer(q) for q in queries[::-1]] + [answer('203.0.113.9')])
+    results = await module._lookup_many(targets)
+    assert [r['query'] for r in results] == targets, results
+    assert sorted(len(queries) for queries in session.requests) == [1, 2, 2, 2], session.requests
+
+
+def main():
+    sys.path.insert(0, ".")
+    asyncio.run(run_checks())
+    print("批量查询回填检查通过")
+
+
+if __name__ == "__main__":
+    main()